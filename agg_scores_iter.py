@@ -1,31 +1,81 @@
-from collections import Counter
+from functools import partial
 import os
 import pickle
 import sys
 import json
 
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from scipy.stats import norm, expon
-import seaborn as sns
-
-import matplotlib
-matplotlib.rcParams['pdf.fonttype'] = 42
-matplotlib.rcParams['ps.fonttype'] = 42
-sns.set_palette(sns.color_palette(["#f4a9b5", "#d68c45", "#4c956c"]))
 
+#graph-evolution has to be importable to unpickle organisms, its modules are only imported by the commands that use them
 sys.path.insert(0, "{}/graph-evolution".format(os.getcwd()))
-from organism import Organism
-from eval_functions import Evaluation
+
+from batch_eval import entropy_bits, population_properties, unique_counts
+from bootstrap_stats import cached_stats, group_stats
+from ingest import experiment_dirs, fan_out_rows, ingest, list_rep_dirs, read_reps
+from instrument import stage
+from population_store import convert_populations, load_population
+from property_cache import eval_config_key, get_cache
+from results_store import read_store, write_store
+from schema import ENTROPY_COLUMNS, FITNESS_COLUMNS, OBJECTIVES, short_name
+from stream_stats import GroupedStats
+from target_dists import exponential_target, normal_target
+from trajectories import TrajectoryWriter
 
 
 OBJECTIVES_OF_INTEREST = ["connectance", "average_positive_interactions_strength", "average_negative_interactions_strength",
                           "number_of_competiton_pairs", "positive_interactions_proportion", "strong_components", 
                           "proportion_of_self_loops", "in_degree_distribution", "out_degree_distribution"]
+OBJECTIVE_FAMILIES = {"topological": ["str comp", "prop self", "connectance"],
+                      "edge_weight": ["recip neg", "avg pos", "avg neg", "pos prop"]}
+
+
+#matplotlib and seaborn take seconds to import, so they are only loaded by the functions that draw
+plt = None
+sns = None
+matplotlib = None
+
+
+def load_plotting():
+    global plt, sns, matplotlib
+    if plt is None:
+        import matplotlib
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        reset_plotting()
+
+
+def reset_plotting():
+    matplotlib.rcdefaults()
+    matplotlib.rcParams['pdf.fonttype'] = 42
+    matplotlib.rcParams['ps.fonttype'] = 42
+    sns.set_palette(sns.color_palette(["#f4a9b5", "#d68c45", "#4c956c"]))
+
+
+#stores read by a batch of commands are loaded once and shared, see run_batch
+_shared_stores = None
+
+
+def load_store(store_path, columns=None, filters=None):
+    if _shared_stores is None:
+        return read_store(store_path, columns, filters)
+    if store_path not in _shared_stores:
+        _shared_stores[store_path] = read_store(store_path)
+    df = _shared_stores[store_path]
+    mask = np.ones(len(df), dtype=bool)
+    for col,value in (filters or {}).items():
+        mask &= df[col].isin(value if isinstance(value, (list, tuple, set)) else [value]).values
+    return df.loc[mask, list(columns) if columns is not None else list(df.columns)].reset_index(drop=True)
+
+
+def plot_frame(df):
+    #seaborn gives every category of a categorical column a slot, even ones filtered out, so stores are plotted as plain values
+    return df.astype({col:str for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)})
 
 
 def entropy_boxplot(df, x, y, hue, group, iter_path, num_obj):
+    load_plotting()
+    df = plot_frame(df)
     figure, axis = plt.subplots(4, 5, figsize=(32,20))
     row = 0
     col = 0
@@ -43,11 +93,13 @@ def entropy_boxplot(df, x, y, hue, group, iter_path, num_obj):
 
 
 def mse_boxplot(df, x, y, hue, group, iter_path, num_obj):
+    load_plotting()
+    df = plot_frame(df)
     figure, axis = plt.subplots(4, 5, figsize=(32,20))
     row = 0
     col = 0
-    for g in df[group].unique():
-        sns.boxplot(data=df.loc[df[group] == g], x=x, y=y, hue=hue, ax=axis[row][col])
+    for g,df_g in df.groupby(group, sort=False):
+        sns.boxplot(data=df_g, x=x, y=y, hue=hue, ax=axis[row][col])
         axis[row][col].set_yscale('log')
         axis[row][col].set_title("Combo {}".format(g))
         row += 1
@@ -60,137 +112,134 @@ def mse_boxplot(df, x, y, hue, group, iter_path, num_obj):
     plt.close()
 
 
-def save_df(data_dir):
-    df_cols = ["experiment_name", "num_obj", "iter_path", "combo", "rep", "network_size", "objective", "MSE"]
+def fitness_rows(experiment_dir, rep_dir, full_rep_path):
     df_rows = []
-
-    for experiment_dir in os.listdir(data_dir):
-        full_obj_path = "{}/{}".format(data_dir, experiment_dir)
-        if not os.path.isfile(full_obj_path):
-            for rep_dir in os.listdir(full_obj_path):
-                full_rep_path = "{}/{}".format(full_obj_path, rep_dir)
-                if not os.path.isfile(full_rep_path):
-                    #skip uncompleted experiments or read in final pop
-                    if not os.path.exists("{}/final_pop.pkl".format(full_rep_path)):
-                        print("Skipped {} rep {}".format(experiment_dir, rep_dir))
-                        break
-                    #read in fitness log
-                    with open("{}/fitness_log.pkl".format(full_rep_path), "rb") as f:
-                        fitness_log = pickle.load(f)
-                    #get details of experiments via experiment directory name
-                    parts_of_experiment_dir_name = experiment_dir.split("_")
-                    experiment_name = experiment_dir
-                    num_obj = parts_of_experiment_dir_name[0]
-                    iter_path = parts_of_experiment_dir_name[1]
-                    combo = parts_of_experiment_dir_name[2]
-                    network_size = parts_of_experiment_dir_name[3]
-                    #add values of interest to a list to turn into a dataframe
-                    for objective,fitnesses in fitness_log.items():
-                        if objective == "number_of_competiton_pairs":
-                            objective = "recip neg"
-                        elif objective == "average_positive_interactions_strength":
-                            objective = "avg pos"
-                        elif objective == "average_negative_interactions_strength":
-                            objective = "avg neg"
-                        elif objective == "positive_interactions_proportion":
-                            objective = "pos prop"
-                        elif objective == "in_degree_distribution":
-                            objective = "in-dd"
-                        elif objective == "out_degree_distribution":
-                            objective = "out-dd"
-                        elif objective == "strong_components":
-                            objective = "str comp"
-                        elif objective == "proportion_of_self_loops":
-                            objective = "prop self"
-                        df_rows.append([experiment_name, num_obj, iter_path, combo, rep_dir, 
-                                        int(network_size), objective, float(fitnesses[-1])])
-
-    df = pd.DataFrame(data=df_rows, columns=df_cols)
-    df.to_pickle("experiments/df.pkl")
-
-
-def save_entropy_df(data_dir):
-    df_cols = ["experiment_name", "num_obj", "iter_path", "combo", "rep", "network_size", 
-               "objective", "under_selection", "mse", "entropy", "num_unique", "pop_size"]
+    #read in fitness log
+    with stage("unpickle_fitness_log"), open("{}/fitness_log.pkl".format(full_rep_path), "rb") as f:
+        fitness_log = pickle.load(f)
+    #get details of experiments via experiment directory name
+    parts_of_experiment_dir_name = experiment_dir.split("_")
+    experiment_name = experiment_dir
+    num_obj = parts_of_experiment_dir_name[0]
+    iter_path = parts_of_experiment_dir_name[1]
+    combo = parts_of_experiment_dir_name[2]
+    network_size = parts_of_experiment_dir_name[3]
+    #runs that stop early have shorter logs, the solution generation is when every objective first hit its target
+    num_generations = min(len(fitnesses) for fitnesses in fitness_log.values())
+    all_hit = np.all([np.asarray(fitnesses[:num_generations]) == 0 for fitnesses in fitness_log.values()], axis=0)
+    solution_generation = int(np.argmax(all_hit)) if np.any(all_hit) else -1
+    #add values of interest to a list to turn into a dataframe
+    for objective,fitnesses in fitness_log.items():
+        df_rows.append([experiment_name, num_obj, iter_path, combo, rep_dir, 
+                        int(network_size), short_name(objective), float(fitnesses[-1]), num_generations, solution_generation])
+    return fan_out_rows(df_rows, experiment_dir, experiment_dirs(os.path.dirname(os.path.dirname(full_rep_path))))
+
+
+def save_df(data_dir, num_workers=1):
+    ingest(data_dir, fitness_rows, FITNESS_COLUMNS, "experiments/df", ["fitness_log.pkl"], num_workers)
+
+
+def trajectory_rows(experiment_dir, rep_dir, full_rep_path, stride=1):
+    with open("{}/fitness_log.pkl".format(full_rep_path), "rb") as f:
+        fitness_log = pickle.load(f)
+    #the configured generation budget, which trajectories of runs that stopped early are padded to
+    with open("{}/config.json".format(os.path.dirname(full_rep_path))) as f:
+        num_generations = json.load(f)["num_generations"]
+    return [(experiment_dir, rep_dir, objective, np.asarray(fitnesses, dtype=np.float32)[::stride], num_generations)
+            for objective,fitnesses in fitness_log.items()]
+
+
+def save_trajectories(data_dir, num_workers=1, stride=1):
+    #store every objective's full error trajectory, keeping every stride-th generation
+    writer = TrajectoryWriter("experiments/trajectories")
+    reps = list_rep_dirs(data_dir)
+    for rows in read_reps(partial(trajectory_rows, stride=stride), reps, num_workers):
+        for experiment_name, rep, objective, trajectory, num_generations in rows:
+            writer.add(experiment_name, rep, objective, trajectory, stride, num_generations)
+    writer.close()
+
+
+_evaluations = {}
+def get_evaluation(full_obj_path):
+    #one Evaluation per config, reused across that config's reps, along with the config's property cache key
+    if full_obj_path not in _evaluations:
+        from eval_functions import Evaluation
+        with open("{}/config.json".format(full_obj_path)) as f:
+            config = json.load(f)
+        _evaluations[full_obj_path] = (Evaluation(config), eval_config_key(config))
+    return _evaluations[full_obj_path]
+
+
+def entropy_rows(experiment_dir, rep_dir, full_rep_path):
     df_rows = []
-
-    for experiment_dir in os.listdir(data_dir):
-        full_obj_path = "{}/{}".format(data_dir, experiment_dir)
-        if not os.path.isfile(full_obj_path):
-            for rep_dir in os.listdir(full_obj_path):
-                full_rep_path = "{}/{}".format(full_obj_path, rep_dir)
-                if not os.path.isfile(full_rep_path):
-                    #skip uncompleted experiments or read in final pop
-                    if not os.path.exists("{}/final_pop.pkl".format(full_rep_path)):
-                        print("Skipped {} rep {}".format(experiment_dir, rep_dir))
-                        break
-                    with open("{}/final_pop.pkl".format(full_rep_path), "rb") as f:
-                        final_pop = pickle.load(f)
-                    #read in fitness log
-                    with open("{}/fitness_log.pkl".format(full_rep_path), "rb") as f:
-                        fitness_log = pickle.load(f)
-                    #read in entropy csv as a dataframe
-                    entropy_df = pd.read_csv("{}/entropy.csv".format(full_rep_path))
-                    #get details of experiments via experiment directory name
-                    parts_of_experiment_dir_name = experiment_dir.split("_")
-                    experiment_name = experiment_dir
-                    num_obj = parts_of_experiment_dir_name[0]
-                    iter_path = parts_of_experiment_dir_name[1]
-                    combo = parts_of_experiment_dir_name[2]
-                    network_size = parts_of_experiment_dir_name[3]
-                    #get unique counts of properties in final pop
-                    config_file = json.load(open("{}/config.json".format(full_obj_path)))
-                    eval_obj = Evaluation(config_file)
-                    for property in OBJECTIVES_OF_INTEREST:
-                        eval_func = getattr(eval_obj, property)
-                        if property.endswith("distribution"):
-                            orgs = [tuple(eval_func(org)) for org in final_pop]
-                        else:
-                            orgs = [eval_func(org) for org in final_pop]
-                        unique_orgs = len(Counter(orgs))
-                        entropy = entropy_df.loc[entropy_df["Name"] == property]["Entropy(bits)"].values[0]
-                        if property in fitness_log:
-                            under_selection = True
-                            fitness = float(fitness_log[property][-1])
-                        else:
-                            under_selection = False
-                            fitness = -1
-                        if property == "number_of_competiton_pairs":
-                            property = "recip neg"
-                        elif property == "average_positive_interactions_strength":
-                            property = "avg pos"
-                        elif property == "average_negative_interactions_strength":
-                            property = "avg neg"
-                        elif property == "positive_interactions_proportion":
-                            property = "pos prop"
-                        elif property == "in_degree_distribution":
-                            property = "in-dd"
-                        elif property == "out_degree_distribution":
-                            property = "out-dd"
-                        elif property == "strong_components":
-                            property = "str comp"
-                        elif property == "proportion_of_self_loops":
-                            property = "prop self"
-                        df_rows.append([experiment_name, num_obj, iter_path, combo, rep_dir, int(network_size), 
-                                        property, under_selection, fitness, float(entropy), unique_orgs, 200])
-
-    df = pd.DataFrame(data=df_rows, columns=df_cols)
-    df.to_pickle("experiments/df_entropy.pkl")
-
-
-def save_mse_boxplots():
-    df = pd.read_pickle("experiments/df.pkl")
-    for iter_exp in df["iter_path"].unique():
-        df_iter = df.loc[df["iter_path"] == iter_exp]
-        for obj_num in df_iter["num_obj"].unique():
-            df_iter_obj = df_iter.loc[df_iter["num_obj"] == obj_num]
-            print("{}_{}".format(iter_exp, obj_num))
-            mse_boxplot(df_iter_obj, "network_size", "MSE", "objective", "combo", iter_exp, obj_num)
+    full_obj_path = os.path.dirname(full_rep_path)
+    with stage("load_population"):
+        final_pop = load_population(full_rep_path)
+    #read in fitness log
+    with stage("unpickle_fitness_log"), open("{}/fitness_log.pkl".format(full_rep_path), "rb") as f:
+        fitness_log = pickle.load(f)
+    #get details of experiments via experiment directory name
+    parts_of_experiment_dir_name = experiment_dir.split("_")
+    experiment_name = experiment_dir
+    num_obj = parts_of_experiment_dir_name[0]
+    iter_path = parts_of_experiment_dir_name[1]
+    combo = parts_of_experiment_dir_name[2]
+    network_size = parts_of_experiment_dir_name[3]
+    #get unique counts and entropy of properties in final pop
+    with stage("evaluation"):
+        eval_obj, config_key = get_evaluation(full_obj_path)
+    property_values = population_properties(final_pop, OBJECTIVES_OF_INTEREST, eval_obj, get_cache(), config_key)
+    for property in OBJECTIVES_OF_INTEREST:
+        with stage("entropy"):
+            counts = unique_counts(property_values[property])
+            unique_orgs = len(counts)
+            entropy = entropy_bits(counts)
+        if property in fitness_log:
+            under_selection = True
+            fitness = float(fitness_log[property][-1])
+        else:
+            under_selection = False
+            fitness = -1
+        df_rows.append([experiment_name, num_obj, iter_path, combo, rep_dir, int(network_size), 
+                        short_name(property), under_selection, fitness, entropy, unique_orgs, len(final_pop)])
+    return fan_out_rows(df_rows, experiment_dir, experiment_dirs(os.path.dirname(os.path.dirname(full_rep_path))))
+
+
+def save_entropy_df(data_dir, num_workers=1):
+    df = ingest(data_dir, entropy_rows, ENTROPY_COLUMNS, "experiments/df_entropy",
+                ["final_pop.pkl", "fitness_log.pkl"], num_workers)
+    write_store(experiment_summary(df), "experiments/df_entropy_summary")
+
+
+def experiment_summary(df):
+    #one row per experiment with whether every objective under selection hit its target in every rep,
+    #a bitmask of the objectives under selection, and which families of objectives were under selection
+    selected = df.loc[df["under_selection"] == True]
+    summary = selected.groupby("experiment_name", observed=True)[["num_obj", "iter_path", "combo", "network_size"]].first()
+    summary["all_targets_hit"] = (selected["mse"] == 0).groupby(selected["experiment_name"], observed=True).all()
+    selected = selected.drop_duplicates(["experiment_name", "objective"])
+    bits = selected["objective"].map({objective:1 << i for i,objective in enumerate(OBJECTIVES)}).astype(np.int64)
+    summary["objective_mask"] = bits.groupby(selected["experiment_name"], observed=True).sum()
+    for family,objectives in OBJECTIVE_FAMILIES.items():
+        family_mask = sum(1 << OBJECTIVES.index(objective) for objective in objectives)
+        summary[family] = (summary["objective_mask"] & family_mask) != 0
+    return summary.reset_index()
+
+
+def save_mse_boxplots(num_workers=1):
+    df = load_store("experiments/df", columns=["num_obj", "iter_path", "combo", "network_size", "objective", "MSE"])
+    jobs = []
+    for (iter_exp, obj_num),df_iter_obj in df.groupby(["iter_path", "num_obj"], sort=False, observed=True):
+        jobs.append(("{}_{}.png".format(iter_exp, obj_num), mse_boxplot,
+                     (df_iter_obj, "network_size", "MSE", "objective", "combo", iter_exp, obj_num)))
+    from render import render_figures
+    render_figures(jobs, num_workers)
 
 
 def save_five_obj_boxplots():
-    df = pd.read_pickle("experiments/df.pkl")
-    df = df.loc[df["num_obj"] == "5"]
+    load_plotting()
+    df = plot_frame(load_store("experiments/df", columns=["num_obj", "iter_path", "network_size", "objective", "MSE"],
+                               filters={"num_obj": "5"}))
     figure, axis = plt.subplots(1, 3, figsize=(18,5))
     col = 0
     for g in df["iter_path"].unique():
@@ -206,13 +255,47 @@ def save_five_obj_boxplots():
     plt.close()
 
 
+def stats_levels(stats, column):
+    #the order seaborn gives the levels of a column, sorted when they are numbers and in data order otherwise
+    if pd.api.types.is_numeric_dtype(stats[column]):
+        return sorted(stats[column].unique())
+    return list(dict.fromkeys(stats.sort_values("order", kind="stable")[column]))
+
+
+def stats_barplot(stats, x, hue, ax, palette=None):
+    #grouped bars of precomputed means with their bootstrap intervals, laid out like seaborn's barplot
+    load_plotting()
+    x_levels = stats_levels(stats, x)
+    hue_levels = stats_levels(stats, hue)
+    colors = sns.color_palette(palette, len(hue_levels))
+    width = 0.8 / len(hue_levels)
+    for i,(level,color) in enumerate(zip(hue_levels, colors)):
+        rows = stats.loc[stats[hue] == level].set_index(x).reindex(x_levels)
+        positions = np.arange(len(x_levels)) - 0.4 + width*(i+0.5)
+        #the mean and the bootstrap means are summed in different orders, so for groups of identical values an end of
+        #the interval can land an ulp past the mean
+        yerr = [np.maximum(rows["mean"]-rows["ci_low"], 0), np.maximum(rows["ci_high"]-rows["mean"], 0)]
+        ax.bar(positions, rows["mean"], width, color=color, label=level, yerr=yerr, ecolor=".26", error_kw={"linewidth": 1.5})
+    ax.set_xticks(np.arange(len(x_levels)))
+    ax.set_xticklabels(x_levels)
+    ax.set(xlabel=x, ylabel="mean")
+    ax.legend(title=hue)
+    return ax
+
+
+def set_comparison_stats():
+    df = load_store("experiments/df", columns=["iter_path", "network_size", "objective", "MSE"])
+    return group_stats(df, ["iter_path", "objective", "network_size"], "MSE")
+
+
 def set_comparison_figure():
+    load_plotting()
     matplotlib.rcParams.update({'font.size': 11})
-    df = pd.read_pickle("experiments/df.pkl")
+    stats = cached_stats("set_comparison", ["experiments/df"], set_comparison_stats, dtypes={"iter_path": str, "objective": str})
     figure, axis = plt.subplots(1, 3, figsize=(16,5))
     col = 0
-    for g in sorted(df["iter_path"].unique()):
-        x = sns.barplot(data=df.loc[df["iter_path"] == g], x="objective", y="MSE", hue="network_size", ax=axis[col], errorbar="ci")
+    for g in sorted(stats["iter_path"].unique()):
+        x = stats_barplot(stats.loc[stats["iter_path"] == g], "objective", "network_size", axis[col])
         x.set(ylabel="Error")
         axis[col].set_yscale("log")
         axis[col].set_ylim(1e-10, 1e4)
@@ -226,14 +309,15 @@ def set_comparison_figure():
 
 
 def degree_dist_section_data():
-    df = pd.read_pickle("experiments/df.pkl")
     network_size = 100
     iter_path = "0"
     num_obj = "4"
+    df = load_store("experiments/df", columns=["experiment_name", "num_obj", "iter_path", "combo", "network_size", "objective", "MSE"],
+                    filters={"iter_path": iter_path})
 
     df1 = df.loc[(df["iter_path"] == iter_path) & (df["network_size"] == network_size) & (df["num_obj"] == num_obj)]
     df1 = df1.loc[(df["objective"] == "in-dd") | (df["objective"] == "out-dd")]
-    print(df1[["iter_path", "combo", "num_obj", "objective", "MSE"]].groupby(["iter_path", "num_obj", "combo", "objective"]).mean())
+    print(df1[["iter_path", "combo", "num_obj", "objective", "MSE"]].groupby(["iter_path", "num_obj", "combo", "objective"], observed=True).mean())
     print(np.mean(df1["MSE"].values))
 
     df1 = df.loc[(df["iter_path"] == iter_path)]
@@ -245,7 +329,8 @@ def degree_dist_section_data():
 
 
 def objective_interactions_data():
-    df = pd.read_pickle("experiments/df.pkl")
+    load_plotting()
+    df = load_store("experiments/df", columns=["experiment_name", "num_obj", "iter_path", "combo", "network_size", "objective", "MSE"])
     num_obj = "3"
     
     df1 = df.loc[(df["num_obj"] == num_obj)]
@@ -254,7 +339,7 @@ def objective_interactions_data():
     for ns in sorted(df1["network_size"].unique()):
         print(ns)
         df_ns11 = df1.loc[df1["network_size"] == ns]
-        df_ns111 = df_ns11[["combo", "iter_path", "MSE"]].groupby(["iter_path", "combo"]).mean()
+        df_ns111 = df_ns11[["combo", "iter_path", "MSE"]].groupby(["iter_path", "combo"], observed=True).mean()
         ns111 = df_ns111.values
         ns111 = np.mean([x for x in ns111 if x != 0])
         #ns111 = np.mean(ns111)
@@ -264,13 +349,13 @@ def objective_interactions_data():
     dd_combos = set(df.loc[(df["objective"] == "in-dd") | (df["objective"] == "out-dd")]["experiment_name"].values)
     df0 = df[~df.experiment_name.isin(dd_combos)]
     df1 = df[df.experiment_name.isin(dd_combos)]
-    print(df0[["network_size", "num_obj", "MSE"]].groupby(["num_obj", "network_size"]).mean())
-    print(df[["network_size", "num_obj", "MSE"]].groupby(["num_obj", "network_size"]).mean())
-    print(df1[["network_size", "num_obj", "MSE"]].groupby(["num_obj", "network_size"]).mean())
+    print(df0[["network_size", "num_obj", "MSE"]].groupby(["num_obj", "network_size"], observed=True).mean())
+    print(df[["network_size", "num_obj", "MSE"]].groupby(["num_obj", "network_size"], observed=True).mean())
+    print(df1[["network_size", "num_obj", "MSE"]].groupby(["num_obj", "network_size"], observed=True).mean())
 
     matplotlib.rcParams.update({'font.size': 12})
     df = df1
-    df["num_obj"] = df["num_obj"].apply(pd.to_numeric)
+    df["num_obj"] = df["num_obj"].astype(np.int64)
     min_val = np.min(df[(df["MSE"] > 0)]["MSE"])
     max_val = np.max(df[(df["MSE"] > 0)]["MSE"])
     figure, axis = plt.subplots(1, 1, figsize=(6,5))
@@ -285,10 +370,65 @@ def objective_interactions_data():
     plt.close()
 
 
+def stream_fitness_stats(data_dir, num_workers=1):
+    #running MSE statistics straight from the run directories, without building the long-format dataframe
+    stats = GroupedStats(["iter_path", "num_obj", "combo", "network_size", "objective", "has_dd"])
+    for rows in read_reps(fitness_rows, list_rep_dirs(data_dir), num_workers):
+        dd_experiments = set(row[0] for row in rows if row[6] in ("in-dd", "out-dd"))
+        for row in rows:
+            stats.add((row[2], row[1], row[3], row[5], row[6], row[0] in dd_experiments), row[7])
+    return stats
+
+
+def mse_table(stats, by, where=None):
+    return stats.table(by, where)[["mean"]].rename(columns={"mean": "MSE"})
+
+
+def degree_dist_section_stream(data_dir, num_workers=1):
+    network_size = 100
+    iter_path = "0"
+    num_obj = "4"
+    stats = stream_fitness_stats(data_dir, num_workers)
+
+    where = {"iter_path": [iter_path], "network_size": [network_size], "num_obj": [num_obj], "objective": ["in-dd", "out-dd"]}
+    print(mse_table(stats, ["iter_path", "num_obj", "combo", "objective"], where))
+    print(stats.total(where).mean)
+
+    print("no DD: ", stats.total({"iter_path": [iter_path], "has_dd": [False]}).mean)
+    print("With DD: ", stats.total({"iter_path": [iter_path], "has_dd": [True]}).mean)
+
+
+def objective_interactions_stream(data_dir, num_workers=1):
+    num_obj = "3"
+    stats = stream_fitness_stats(data_dir, num_workers)
+
+    where = {"num_obj": [num_obj], "has_dd": [False]}
+    for ns in stats.table(["network_size"], where).index:
+        print(ns)
+        df_ns111 = mse_table(stats, ["iter_path", "combo"], dict(where, network_size=[ns]))
+        ns111 = np.mean([x for x in df_ns111["MSE"].values if x != 0])
+        print(df_ns111)
+        print(ns111)
+
+    print(mse_table(stats, ["num_obj", "network_size"], {"has_dd": [False]}))
+    print(mse_table(stats, ["num_obj", "network_size"]))
+    print(mse_table(stats, ["num_obj", "network_size"], {"has_dd": [True]}))
+
+
+def time_to_solution_data():
+    df = load_store("experiments/df", columns=["experiment_name", "rep", "num_obj", "network_size", "num_generations", "solution_generation"])
+    df = df.drop_duplicates(["experiment_name", "rep"])
+    df["solved"] = df["solution_generation"] >= 0
+    print(df[["num_obj", "network_size", "solved", "num_generations"]].groupby(["num_obj", "network_size"], observed=True).mean())
+    df_solved = df.loc[df["solved"]]
+    print(df_solved[["num_obj", "network_size", "solution_generation"]].groupby(["num_obj", "network_size"], observed=True).describe())
+
+
 def final_figures():
-    df = pd.read_pickle("experiments/df.pkl")
+    load_plotting()
+    df = load_store("experiments/df", columns=["experiment_name", "num_obj", "network_size", "objective", "MSE"])
     matplotlib.rcParams.update({'font.size': 12})
-    df["num_obj"] = df["num_obj"].apply(pd.to_numeric)
+    df["num_obj"] = df["num_obj"].astype(np.int64)
 
     dd_combos = set(df.loc[(df["objective"] == "in-dd") | (df["objective"] == "out-dd")]["experiment_name"].values)
     df1 = df[~df.experiment_name.isin(dd_combos)]
@@ -320,49 +460,36 @@ def final_figures():
     plt.close()
 
 
-def entropy_data():
-    which_set = 2
-
-    topological = ["str comp", "prop self", "connectance"]
-    weight = ["recip neg", "avg pos", "avg neg", "pos prop"]
-
-    df = pd.read_pickle("experiments/df_entropy.pkl")
+def perfect_diversity_df(iter_path, excluded_family, objective):
+    #diversity of an unselected objective in runs that hit every target without selecting on excluded_family
+    summary = load_store("experiments/df_entropy_summary", filters={"iter_path": iter_path})
+    perfect_runs = summary.loc[summary["all_targets_hit"] & ~summary[excluded_family], "experiment_name"]
+    df = load_store("experiments/df_entropy", filters={"iter_path": iter_path, "objective": objective, "under_selection": False})
+    df = df[df.experiment_name.isin(perfect_runs)].copy()
     df["uniformity"] = df["entropy"] / np.log2(df["num_unique"])
     df["uniformity"] = df["uniformity"].fillna(0)
     df["spread"] = df["num_unique"] / df["pop_size"]
+    return df
 
-    perfect_runs = []
-    for experiment_name in df["experiment_name"].unique():
-        num_scores = df.loc[(df["experiment_name"] == experiment_name) & (df["under_selection"] == True)]
-        perfect = df.loc[(df["experiment_name"] == experiment_name) & (df["under_selection"] == True) & (df["mse"] == 0)]
-        if len(perfect) == len(num_scores):
-            perfect_runs.append(experiment_name)
-    df_perf = df[df.experiment_name.isin(perfect_runs)]
+
+def entropy_data():
+    which_set = 2
 
     if which_set == 0:
-        df0 = df_perf.loc[(df_perf["iter_path"] == "0")]
-        invalid = set(df0[df0.objective.isin(weight) & (df0["under_selection"] == True)]["experiment_name"].values)
-        df0 = df0[~df0.experiment_name.isin(invalid)]
-        df0 = df0.loc[(df0["under_selection"] == False) & (df0["objective"] == "avg pos")]
+        df0 = perfect_diversity_df("0", "edge_weight", "avg pos")
     else:
-        df0 = df_perf.loc[(df_perf["iter_path"] == "2")]
-        invalid = set(df0[df0.objective.isin(topological) & (df0["under_selection"] == True)]["experiment_name"].values)
-        df0 = df0[~df0.experiment_name.isin(invalid)]
-        df0 = df0.loc[(df0["under_selection"] == False) & (df0["objective"] == "connectance")]
+        df0 = perfect_diversity_df("2", "topological", "connectance")
     
-    print(df0[["iter_path", "network_size", "combo", "num_obj", "objective", "num_unique", "uniformity", "spread"]].groupby(["iter_path", "network_size", "num_obj", "combo", "objective"]).mean())
+    print(df0[["iter_path", "network_size", "combo", "num_obj", "objective", "num_unique", "uniformity", "spread"]].groupby(["iter_path", "network_size", "num_obj", "combo", "objective"], observed=True).mean())
     print(df0[["num_unique", "uniformity", "spread"]].mean())
 
 
 def generate_dist_plots():
+    load_plotting()
     num_nodes = 100
     network_size = num_nodes
-    ns_inv = 1/network_size
-    if network_size == 10:
-        basically_exp = [ns_inv*np.floor(expon.pdf(x, loc=1, scale=network_size/5)/ns_inv) for x in range(network_size+1)]
-    else:
-        basically_exp = [ns_inv*np.round(expon.pdf(x, loc=1, scale=network_size/5)/ns_inv) for x in range(network_size+1)]
-    basically_norm = [ns_inv*np.round(norm.pdf(x, loc=network_size/4, scale=network_size/10)/ns_inv) for x in range(network_size+1)]
+    basically_exp = exponential_target(network_size)
+    basically_norm = normal_target(network_size)
 
     fig, ax2 = plt.subplots(1, 2, figsize=(7, 5))
     ax2[0].plot(list(range(num_nodes+1)), basically_exp, linewidth=5, color="deeppink")
@@ -377,13 +504,19 @@ def generate_dist_plots():
     plt.close()
 
 
+def poster_error_stats():
+    df = load_store("experiments/df", columns=["num_obj", "network_size", "MSE"])
+    df["num_obj"] = df["num_obj"].astype(np.int64)
+    return group_stats(df, ["num_obj", "network_size"], "MSE")
+
+
 def poster_error():
-    df = pd.read_pickle("experiments/df.pkl")
+    load_plotting()
+    stats = cached_stats("poster_error", ["experiments/df"], poster_error_stats)
     matplotlib.rcParams.update({"font.size": 20})
-    df["num_obj"] = df["num_obj"].apply(pd.to_numeric)
 
     figure, axis = plt.subplots(1, 1, figsize=(10,10), dpi=150)
-    x = sns.barplot(data=df, x="num_obj", y="MSE", hue="network_size", ax=axis, errorbar="ci", palette="Greens_d")
+    x = stats_barplot(stats, "num_obj", "network_size", axis, palette="Greens_d")
     x.legend(framealpha=0.33, title="Graph Size")
     axis.set_yscale('log')
     x.set(xlabel="Number of Constrained Properties")
@@ -394,41 +527,27 @@ def poster_error():
     plt.close()
 
 
-def poster_diversity():
-    topological = ["str comp", "prop self", "connectance"]
-    weight = ["recip neg", "avg pos", "avg neg", "pos prop"]
-
-    df = pd.read_pickle("experiments/df_entropy.pkl")
-    df["uniformity"] = df["entropy"] / np.log2(df["num_unique"])
-    df["uniformity"] = df["uniformity"].fillna(0)
-    df["spread"] = df["num_unique"] / df["pop_size"]
-
-    perfect_runs = []
-    for experiment_name in df["experiment_name"].unique():
-        num_scores = df.loc[(df["experiment_name"] == experiment_name) & (df["under_selection"] == True)]
-        perfect = df.loc[(df["experiment_name"] == experiment_name) & (df["under_selection"] == True) & (df["mse"] == 0)]
-        if len(perfect) == len(num_scores):
-            perfect_runs.append(experiment_name)
-    df_perf = df[df.experiment_name.isin(perfect_runs)]
-
-    df_t = df_perf.loc[(df_perf["iter_path"] == "0")]
-    invalid = set(df_t[df_t.objective.isin(weight) & (df_t["under_selection"] == True)]["experiment_name"].values)
-    df_t = df_t[~df_t.experiment_name.isin(invalid)]
-    df_t = df_t.loc[(df_t["under_selection"] == False) & (df_t["objective"] == "avg pos")]
+def poster_diversity_stats(diversity_measure):
+    df_t = perfect_diversity_df("0", "edge_weight", "avg pos")
     df_t["div_group"] = "Topological"
 
-    df_e = df_perf.loc[(df_perf["iter_path"] == "2")]
-    invalid = set(df_e[df_e.objective.isin(topological) & (df_e["under_selection"] == True)]["experiment_name"].values)
-    df_e = df_e[~df_e.experiment_name.isin(invalid)]
-    df_e = df_e.loc[(df_e["under_selection"] == False) & (df_e["objective"] == "connectance")]
+    df_e = perfect_diversity_df("2", "topological", "connectance")
     df_e["div_group"] = "Edge-Weight"
 
     df_div = pd.concat([df_e, df_t])
+    #keep the order the groups are drawn in
+    df_div["div_group"] = pd.Categorical(df_div["div_group"], categories=["Edge-Weight", "Topological"])
+    return group_stats(df_div, ["div_group", "network_size"], diversity_measure)
 
+
+def poster_diversity():
+    load_plotting()
     diversity_measure = "spread"
+    stats = cached_stats("poster_diversity_{}".format(diversity_measure), ["experiments/df_entropy", "experiments/df_entropy_summary"],
+                         partial(poster_diversity_stats, diversity_measure), dtypes={"div_group": str})
     matplotlib.rcParams.update({"font.size": 20})
     figure, axis = plt.subplots(1, 1, figsize=(10,5), dpi=150)
-    x = sns.barplot(data=df_div, x="div_group", y=diversity_measure, hue="network_size", ax=axis, errorbar="ci", palette="Greens_d")
+    x = stats_barplot(stats, "div_group", "network_size", axis, palette="Greens_d")
     x.legend(framealpha=0.33, title="Graph Size")
     x.set(xlabel="Type of Constrained Properties")
     x.set(ylabel=diversity_measure)
@@ -438,32 +557,51 @@ def poster_diversity():
     plt.close()
 
 
-if __name__ == "__main__":
-    if len(sys.argv) == 3:
-        if sys.argv[-1] == "save":
-            save_df(sys.argv[1])
-        elif sys.argv[-1] == "save_entropy":
-            save_entropy_df(sys.argv[1])
-        else:
-            print("Please give a valid save function.")
-    elif len(sys.argv) == 2:
-        if sys.argv[-1] == "mse":
-            save_mse_boxplots()
-        elif sys.argv[-1] == "five":
-            save_five_obj_boxplots()
-        elif sys.argv[-1] == "dist":
-            degree_dist_section_data()
-        elif sys.argv[-1] == "final":
-            final_figures()
-        elif sys.argv[-1] == "set":
-            set_comparison_figure()
-        elif sys.argv[-1] == "entropy":
-            entropy_data()
-        elif sys.argv[-1] == "poster1":
-            poster_error()
-        elif sys.argv[-1] == "poster2":
-            poster_diversity()
+#python3 agg_scores_iter.py [command] [numbers], or python3 agg_scores_iter.py [location with the raw data] [data command] [numbers]
+COMMANDS = {"mse": save_mse_boxplots, "five": save_five_obj_boxplots, "dist": degree_dist_section_data,
+            "tts": time_to_solution_data, "final": final_figures, "set": set_comparison_figure,
+            "entropy": entropy_data, "poster1": poster_error, "poster2": poster_diversity}
+DATA_COMMANDS = {"save": save_df, "save_entropy": save_entropy_df, "convert_pop": convert_populations,
+                 "save_trajectories": save_trajectories, "dist_stream": degree_dist_section_stream,
+                 "interactions_stream": objective_interactions_stream}
+
+
+def run_command(command, args):
+    #each command starts from the same matplotlib settings, whatever ran before it
+    if plt is not None:
+        reset_plotting()
+    COMMANDS[command](*[int(arg) for arg in args])
+
+
+def run_batch(argv):
+    #run several commands in one process, e.g. batch five dist mse 4 set, each store is read once and shared by all of them
+    global _shared_stores
+    commands = []
+    for arg in argv:
+        if arg.isdigit() and len(commands) > 0:
+            commands[-1][1].append(arg)
         else:
-            print("Please give a valid function to run.")
+            commands.append((arg, []))
+    invalid = [command for command,_ in commands if command not in COMMANDS]
+    if len(invalid) > 0:
+        print("Please give valid functions to run, {} are not.".format(", ".join(invalid)))
+        return
+    _shared_stores = {}
+    for command,args in commands:
+        run_command(command, args)
+
+
+if __name__ == "__main__":
+    if "--profile" in sys.argv:
+        sys.argv.remove("--profile")
+        os.environ["AGG_PROFILE"] = "1"
+    if len(sys.argv) >= 2 and sys.argv[1] == "batch":
+        run_batch(sys.argv[2:])
+    elif len(sys.argv) >= 2 and sys.argv[1] in COMMANDS:
+        run_command(sys.argv[1], sys.argv[2:])
+    elif len(sys.argv) >= 3 and sys.argv[2] in DATA_COMMANDS:
+        DATA_COMMANDS[sys.argv[2]](sys.argv[1], *[int(arg) for arg in sys.argv[3:]])
+    elif len(sys.argv) >= 2:
+        print("Please give a valid function to run, one of {} or batch.".format(", ".join(COMMANDS)))
     else:
-        print("Please give inputs for the script.")
\ No newline at end of file
+        print("Please give inputs for the script.")
@@ -0,0 +1,221 @@
+import numpy as np
+
+from instrument import stage
+from property_cache import GENOME_DTYPE, genome_key
+
+
+#properties that are computed for the whole population at once, everything else falls back to Evaluation
+BATCHED_PROPERTIES = ["connectance", "proportion_of_self_loops", "positive_interactions_proportion",
+                      "negative_interactions_proportion", "average_positive_interactions_strength",
+                      "average_negative_interactions_strength", "in_degree_distribution", "out_degree_distribution"]
+#properties that are also batched when the population is evaluated as sparse graphs
+SPARSE_PROPERTIES = ["strong_components"]
+#populations of graphs with at least this many nodes and at most this proportion of edges use the sparse path
+SPARSE_MIN_NODES = 50
+SPARSE_MAX_DENSITY = 0.5
+
+
+def genome_matrices(final_pop):
+    #the adjacency matrices of a population as one (popsize, network_size, network_size) array of GENOME_DTYPE
+    #converted populations are already saved in it, so their memory-mapped genomes are used without a copy
+    if hasattr(final_pop, "genomes"):
+        return np.asarray(final_pop.genomes, dtype=GENOME_DTYPE)
+    return np.stack([np.asarray(org.genome, dtype=GENOME_DTYPE) for org in final_pop])
+
+
+def unique_genomes(genomes):
+    #the first organism, key and number of every distinct genome, and which distinct genome each organism has
+    #genomes are told apart by hashing them one at a time rather than sorting the whole population
+    positions = {}
+    keys = []
+    first_index = []
+    inverse = np.empty(len(genomes), dtype=np.int64)
+    for i in range(len(genomes)):
+        key = genome_key(genomes[i])
+        if key not in positions:
+            positions[key] = len(keys)
+            keys.append(key)
+            first_index.append(i)
+        inverse[i] = positions[key]
+    return np.array(first_index), keys, inverse
+
+
+def _safe_divide(numerator, denominator):
+    return np.divide(numerator, denominator, out=np.zeros(len(numerator)), where=denominator != 0)
+
+
+def _block_sums(values, starts, counts):
+    #sum of each organism's block of values, reduceat needs the starts of empty blocks left out
+    sums = np.zeros(len(starts))
+    nonempty = counts > 0
+    if nonempty.any():
+        sums[nonempty] = np.add.reduceat(values, starts[nonempty], dtype=np.float64)
+    return sums
+
+
+def use_sparse_path(genomes):
+    pop_size, network_size, _ = genomes.shape
+    return network_size >= SPARSE_MIN_NODES and np.count_nonzero(genomes) <= SPARSE_MAX_DENSITY*genomes.size
+
+
+def sparse_population(genomes, indices):
+    #one block diagonal CSR adjacency matrix of the organisms at indices, the p-th owns nodes p*n to (p+1)*n-1
+    #built one organism at a time so only the edges are ever copied out of the population
+    #scipy.sparse is only imported by populations that take the sparse path
+    from scipy.sparse import csr_matrix
+    network_size = genomes.shape[1]
+    rows = []
+    cols = []
+    weights = []
+    for p,index in enumerate(indices):
+        genome = genomes[index]
+        i, j = np.nonzero(genome)
+        rows.append(p*network_size+i)
+        cols.append(p*network_size+j)
+        weights.append(genome[i, j])
+    size = len(indices)*network_size
+    return csr_matrix((np.concatenate(weights), (np.concatenate(rows), np.concatenate(cols))), shape=(size, size))
+
+
+def strong_component_counts(adjacency, pop_size, network_size):
+    #components never cross blocks, so each organism's count is the number of distinct labels among its nodes
+    from scipy.sparse.csgraph import connected_components
+    _, labels = connected_components(adjacency, directed=True, connection="strong")
+    labels = np.sort(labels.reshape(pop_size, network_size), axis=1)
+    return 1 + np.count_nonzero(np.diff(labels, axis=1), axis=1)
+
+
+def degree_distributions(degrees):
+    #proportion of nodes with each degree 0..network_size, one row per organism
+    pop_size, network_size = degrees.shape
+    offsets = np.arange(pop_size)[:, None]*(network_size+1)
+    counts = np.bincount((degrees+offsets).ravel(), minlength=pop_size*(network_size+1))
+    return counts.reshape(pop_size, network_size+1) / network_size
+
+
+def batched_properties(genomes, properties):
+    pop_size, network_size, _ = genomes.shape
+    flat = genomes.reshape(pop_size, -1)
+    positive = flat > 0
+    negative = flat < 0
+    num_pos = positive.sum(axis=1)
+    num_neg = negative.sum(axis=1)
+    num_interactions = num_pos + num_neg
+
+    values = {}
+    for property in properties:
+        if property == "connectance":
+            values[property] = num_interactions / network_size**2
+        elif property == "proportion_of_self_loops":
+            diagonals = np.diagonal(genomes, axis1=1, axis2=2)
+            values[property] = np.count_nonzero(diagonals, axis=1) / network_size
+        elif property == "positive_interactions_proportion":
+            values[property] = _safe_divide(num_pos, num_interactions)
+        elif property == "negative_interactions_proportion":
+            values[property] = _safe_divide(num_neg, num_interactions)
+        elif property == "average_positive_interactions_strength":
+            values[property] = _safe_divide(np.where(positive, flat, 0).sum(axis=1, dtype=np.float64), num_pos)
+        elif property == "average_negative_interactions_strength":
+            values[property] = _safe_divide(np.where(negative, flat, 0).sum(axis=1, dtype=np.float64), num_neg)
+        elif property == "in_degree_distribution":
+            values[property] = degree_distributions(np.count_nonzero(genomes, axis=1))
+        elif property == "out_degree_distribution":
+            values[property] = degree_distributions(np.count_nonzero(genomes, axis=2))
+    return values
+
+
+def sparse_properties(genomes, indices, properties):
+    #the batched properties of the organisms at indices, computed from the edges of their CSR matrix
+    #each organism's edges are one contiguous block of the matrix's data, so per organism sums are one reduceat
+    pop_size = len(indices)
+    network_size = genomes.shape[1]
+    adjacency = sparse_population(genomes, indices)
+    block_bounds = adjacency.indptr[::network_size]
+    starts = block_bounds[:-1]
+    num_interactions = np.diff(block_bounds)
+    weights = adjacency.data
+    positive = weights > 0
+    num_pos = _block_sums(positive, starts, num_interactions)
+    num_neg = num_interactions - num_pos
+
+    values = {}
+    for property in properties:
+        if property == "connectance":
+            values[property] = num_interactions / network_size**2
+        elif property == "proportion_of_self_loops":
+            rows = np.repeat(np.arange(pop_size*network_size), np.diff(adjacency.indptr))
+            values[property] = _block_sums(adjacency.indices == rows, starts, num_interactions) / network_size
+        elif property == "positive_interactions_proportion":
+            values[property] = _safe_divide(num_pos, num_interactions)
+        elif property == "negative_interactions_proportion":
+            values[property] = _safe_divide(num_neg, num_interactions)
+        elif property == "average_positive_interactions_strength":
+            values[property] = _safe_divide(_block_sums(np.where(positive, weights, 0), starts, num_interactions), num_pos)
+        elif property == "average_negative_interactions_strength":
+            values[property] = _safe_divide(_block_sums(np.where(positive, 0, weights), starts, num_interactions), num_neg)
+        elif property == "in_degree_distribution":
+            degrees = np.bincount(adjacency.indices, minlength=pop_size*network_size).reshape(pop_size, network_size)
+            values[property] = degree_distributions(degrees)
+        elif property == "out_degree_distribution":
+            values[property] = degree_distributions(np.diff(adjacency.indptr).reshape(pop_size, network_size))
+        elif property == "strong_components":
+            values[property] = strong_component_counts(adjacency, pop_size, network_size)
+    return values
+
+
+def population_properties(final_pop, properties, eval_obj, cache=None, config_key=None):
+    #values of each property for every organism, as a (popsize,) or (popsize, k) array
+    #identical organisms are evaluated once, and with a cache only organisms and properties it has not seen are evaluated
+    with stage("batched_properties"):
+        genomes = genome_matrices(final_pop)
+        first_index, genome_keys, inverse = unique_genomes(genomes)
+    num_unique = len(first_index)
+
+    cached = {}
+    missing = {}
+    with stage("cache_lookup"):
+        for property in properties:
+            cached[property] = cache.get_many(genome_keys, property, config_key) if cache is not None else {}
+            missing[property] = [u for u in range(num_unique) if genome_keys[u] not in cached[property]]
+
+    computed = {property:{} for property in properties}
+    sparse = use_sparse_path(genomes)
+    batchable = BATCHED_PROPERTIES + SPARSE_PROPERTIES if sparse else BATCHED_PROPERTIES
+    batched = [property for property in properties if property in batchable and missing[property]]
+    if batched:
+        with stage("sparse_properties" if sparse else "batched_properties"):
+            todo = sorted(set(u for property in batched for u in missing[property]))
+            if sparse:
+                batch_values = sparse_properties(genomes, first_index[todo], batched)
+            else:
+                batch_values = batched_properties(genomes[first_index[todo]], batched)
+            position = {u:i for i,u in enumerate(todo)}
+            for property in batched:
+                computed[property] = {u:batch_values[property][position[u]] for u in missing[property]}
+    for property in properties:
+        if property not in batchable and missing[property]:
+            with stage("property:{}".format(property)):
+                eval_func = getattr(eval_obj, property)
+                computed[property] = {u:eval_func(final_pop[first_index[u]]) for u in missing[property]}
+
+    values = {}
+    for property in properties:
+        if cache is not None and computed[property]:
+            with stage("cache_store"):
+                cache.put_many([(genome_keys[u], property, config_key, value) for u,value in computed[property].items()])
+        unique_values = [computed[property][u] if u in computed[property] else cached[property][genome_keys[u]]
+                         for u in range(num_unique)]
+        values[property] = np.array([np.asarray(value) for value in unique_values])[inverse]
+    return values
+
+
+def unique_counts(values):
+    #how many organisms share each distinct value (or distinct row for distributions)
+    if values.ndim == 1:
+        return np.unique(values, return_counts=True)[1]
+    return np.unique(values.reshape(len(values), -1), axis=0, return_counts=True)[1]
+
+
+def entropy_bits(counts):
+    proportions = counts / counts.sum()
+    return float(-np.sum(proportions*np.log2(proportions)))
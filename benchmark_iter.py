@@ -0,0 +1,127 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import os
+import pickle
+import resource
+import shutil
+import subprocess
+import time
+
+import numpy as np
+
+
+#times each stage of the aggregation pipeline on a synthetic run tree laid out like iteration_experiment's output
+#every stage runs in a fresh process so its peak RSS is its own
+STAGES = ["ingest", "property_evaluation", "entropy_dataframe", "render"]
+#stages that read what another stage writes, render plots the experiments/df store that ingest saves
+REQUIRED_STAGES = {"render": "ingest"}
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def make_run_tree(data_dir, network_sizes, num_configs, num_reps, popsize, num_generations, seed=0):
+    from agg_scores_iter import OBJECTIVES_OF_INTEREST
+    from organism import Organism
+    rng = np.random.default_rng(seed)
+    for network_size in network_sizes:
+        for c in range(num_configs):
+            num_obj = c % 5 + 1
+            objectives = list(rng.choice(OBJECTIVES_OF_INTEREST, size=num_obj, replace=False))
+            experiment_dir = "{}/{}_{}_{}_{}".format(data_dir, num_obj, c % 3, c, network_size)
+            config = {"name": os.path.basename(experiment_dir), "popsize": popsize, "network_size": network_size,
+                      "num_generations": num_generations, "weight_range": [-1,1],
+                      "eval_funcs": {objective:{"target": 0} for objective in objectives}}
+            os.makedirs(experiment_dir)
+            with open("{}/config.json".format(experiment_dir), "w") as f:
+                json.dump(config, f, indent=4)
+            for rep in range(num_reps):
+                rep_dir = "{}/{}".format(experiment_dir, rep)
+                os.makedirs(rep_dir)
+                decay = np.exp(-np.arange(num_generations)/(num_generations/5))
+                fitness_log = {objective:list(rng.random()*decay*(rng.random() > 0.3)) for objective in objectives}
+                with open("{}/fitness_log.pkl".format(rep_dir), "wb") as f:
+                    pickle.dump(fitness_log, f)
+                final_pop = []
+                for _ in range(popsize):
+                    genome = rng.uniform(-1, 1, (network_size, network_size)) * (rng.random((network_size, network_size)) < 0.25)
+                    final_pop.append(Organism(network_size, 0.25, [-1,1], genome))
+                with open("{}/final_pop.pkl".format(rep_dir), "wb") as f:
+                    pickle.dump(final_pop, f)
+                with open("{}/entropy.csv".format(rep_dir), "w") as f:
+                    f.write("Name,Entropy(bits)\n")
+                    for objective in OBJECTIVES_OF_INTEREST:
+                        f.write("{},{}\n".format(objective, rng.random()*np.log2(popsize)))
+
+
+def run_stage(stage, work_dir, num_workers):
+    #imported before changing directory so graph-evolution is found relative to the repo
+    import agg_scores_iter
+    from batch_eval import population_properties
+    from ingest import list_rep_dirs
+    from population_store import load_population
+    os.chdir(work_dir)
+    data_dir = "{}/runs".format(work_dir)
+    start = time.perf_counter()
+    if stage == "ingest":
+        agg_scores_iter.save_df(data_dir, num_workers)
+    elif stage == "property_evaluation":
+        for _, _, full_rep_path in list_rep_dirs(data_dir):
+            eval_obj, _ = agg_scores_iter.get_evaluation(os.path.dirname(full_rep_path))
+            population_properties(load_population(full_rep_path), agg_scores_iter.OBJECTIVES_OF_INTEREST, eval_obj)
+    elif stage == "entropy_dataframe":
+        agg_scores_iter.save_entropy_df(data_dir, num_workers)
+    elif stage == "render":
+        agg_scores_iter.save_mse_boxplots(num_workers)
+    seconds = time.perf_counter() - start
+    peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return seconds, peak_rss / 1024
+
+
+def git_commit():
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True)
+    return result.stdout.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the aggregation pipeline on a synthetic run tree.")
+    parser.add_argument("--network_sizes", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--num_configs", type=int, default=10, help="configs per network size")
+    parser.add_argument("--num_reps", type=int, default=3)
+    parser.add_argument("--popsize", type=int, default=200)
+    parser.add_argument("--num_generations", type=int, default=500)
+    parser.add_argument("--num_workers", type=int, default=1)
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES)
+    parser.add_argument("--work_dir", default="/tmp/graph_evolution_benchmark")
+    parser.add_argument("--output", default="bench_results.jsonl", help="results are appended as one JSON object per stage")
+    args = parser.parse_args()
+
+    os.chdir(REPO_DIR)
+    if os.path.exists(args.work_dir):
+        shutil.rmtree(args.work_dir)
+    os.makedirs("{}/experiments".format(args.work_dir))
+    start = time.perf_counter()
+    make_run_tree("{}/runs".format(args.work_dir), args.network_sizes, args.num_configs, args.num_reps,
+                  args.popsize, args.num_generations)
+    num_reps = len(args.network_sizes)*args.num_configs*args.num_reps
+    print("Generated {} reps in {:.1f}s".format(num_reps, time.perf_counter()-start))
+
+    params = {key:value for key,value in vars(args).items() if key not in ("stages", "work_dir", "output")}
+    context = multiprocessing.get_context("spawn")
+    with open(args.output, "a") as f:
+        for i,stage in enumerate(args.stages):
+            #a required stage that is not benchmarked before this one is run first in its own process and not recorded
+            required = REQUIRED_STAGES.get(stage)
+            if required is not None and required not in args.stages[:i]:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    executor.submit(run_stage, required, args.work_dir, args.num_workers).result()
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                seconds, peak_rss_mb = executor.submit(run_stage, stage, args.work_dir, args.num_workers).result()
+            result = {"commit": git_commit(), "stage": stage, "seconds": seconds, "reps": num_reps,
+                      "reps_per_second": num_reps/seconds, "peak_rss_mb": peak_rss_mb, "params": params}
+            print("{}: {:.2f}s, {:.1f} reps/s, peak RSS {:.0f} MB".format(stage, seconds, num_reps/seconds, peak_rss_mb))
+            f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
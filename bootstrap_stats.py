@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+#means and percentile bootstrap confidence intervals of every group of a dataframe in one pass,
+#the same estimate seaborn's errorbar="ci" makes but computed once and saved next to the data instead of on every render
+#a bootstrap resample of n values is a row of counts of how often each value is drawn, so the resampled means of
+#every group of size n are one matrix product with a (n_boot, n) count matrix that all those groups share
+STATS_DIR = "experiments/stats"
+N_BOOT = 1000
+CI = 95
+SEED = 0
+
+
+def resampling_matrix(n, n_boot=N_BOOT, seed=SEED):
+    #seeded by the group size too, so a group's interval does not depend on what other groups are in the frame
+    rng = np.random.default_rng([seed, n])
+    draws = rng.integers(0, n, size=(n_boot, n)) + n*np.arange(n_boot)[:,None]
+    return np.bincount(draws.ravel(), minlength=n_boot*n).reshape(n_boot, n).astype(np.float64)
+
+
+def group_stats(df, by, value, n_boot=N_BOOT, ci=CI, seed=SEED):
+    #one row per group of by with the mean, bootstrap interval and number of non-missing values,
+    #and the order the groups first appear in df so plots can keep the data's order like seaborn does
+    df = df.loc[df[value].notna(), by + [value]]
+    grouped = df.groupby(by, sort=True, observed=True)
+    group_ids = grouped.ngroup().values
+    sizes = np.bincount(group_ids)
+    values = np.split(df[value].values[np.argsort(group_ids, kind="stable")], np.cumsum(sizes)[:-1])
+    means = np.array([v.mean() for v in values])
+    low = np.empty(len(values))
+    high = np.empty(len(values))
+    for n in np.unique(sizes):
+        members = np.flatnonzero(sizes == n)
+        boot_means = np.stack([values[i] for i in members]) @ resampling_matrix(n, n_boot, seed).T / n
+        low[members], high[members] = np.percentile(boot_means, [(100-ci)/2, 100-(100-ci)/2], axis=1)
+    stats = grouped.size().index.to_frame(index=False)
+    stats["mean"] = means
+    stats["ci_low"] = low
+    stats["ci_high"] = high
+    stats["n"] = sizes
+    first_rows = pd.Series(np.arange(len(df))).groupby(group_ids).min().values
+    stats["order"] = np.argsort(np.argsort(first_rows))
+    return stats
+
+
+def stats_path(name):
+    return "{}/{}.csv".format(STATS_DIR, name)
+
+
+def cached_stats(name, sources, compute, dtypes=None):
+    #load the saved statistics, or compute and save them if any of the source stores was written after them
+    #dtypes are given to read_csv for key columns that compute returns as strings of numbers, like iter_path,
+    #so saved statistics come back the same as fresh ones
+    path = stats_path(name)
+    if os.path.exists(path):
+        stats_time = os.path.getmtime(path)
+        if all(os.path.getmtime("{}/schema.json".format(source)) < stats_time for source in sources):
+            return pd.read_csv(path, dtype=dtypes)
+    stats = compute()
+    if not os.path.exists(STATS_DIR):
+        os.makedirs(STATS_DIR)
+    stats.to_csv(path, index=False)
+    return stats
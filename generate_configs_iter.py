@@ -1,14 +1,25 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
 from itertools import combinations
 import json
 import os
+import subprocess
 import sys
+import time
 
 import numpy as np
-from scipy.stats import norm, expon
 
+from target_dists import exponential_target, normal_target
+
+
+def config_hash(config):
+    #content address of a config, ignoring what it is called and where its data is saved
+    content = {key:value for key,value in config.items() if key not in ("name", "data_dir")}
+    return hashlib.sha1(json.dumps(content, sort_keys=True).encode()).hexdigest()
 
-def experiment_config(exp_dir, objectives_name, eval_funcs, network_size):
-    exp_name = "{}_{}".format(objectives_name, network_size)
+
+def build_config(exp_dir, exp_name, eval_funcs, network_size):
+    num_generations = 500 if network_size == 10 else 10000
 
     config = {
         "data_dir": exp_dir,
@@ -24,9 +35,27 @@ def experiment_config(exp_dir, objectives_name, eval_funcs, network_size):
         "crossover_rate": 0.6,
         "weight_range": [-1,1],
         "network_size": network_size,
-        "num_generations": 500 if network_size == 10 else 10000,
-        "eval_funcs": eval_funcs
+        "num_generations": num_generations,
+        "eval_funcs": eval_funcs,
+        #stop once every objective hits its target, or once no objective has improved for patience generations
+        "early_stopping": {
+            "all_targets_hit": True,
+            "patience": num_generations // 10
+        }
     }
+    return config
+
+
+def experiment_config(exp_dir, objectives_name, eval_funcs, network_size, config_hashes=None):
+    #config_hashes maps the hash of every config written so far to its name, duplicates reuse that name
+    exp_name = "{}_{}".format(objectives_name, network_size)
+    config = build_config(exp_dir, exp_name, eval_funcs, network_size)
+    content_hash = config_hash(config)
+    if config_hashes is not None:
+        if content_hash in config_hashes:
+            return config_hashes[content_hash]
+        config_hashes[content_hash] = exp_name
+    config["config_hash"] = content_hash
 
     config_path = "experiments/configs/{}.json".format(exp_name)
     with open(config_path, "w") as f:
@@ -41,36 +70,189 @@ def chunks(lst, n):
         yield lst[i:i + n]
 
 
-def generate_scripts(exp_dir, config_names, save_dir):
+def generate_scripts(config_names, save_dir):
     cwd = os.getcwd()
     config_chunks = chunks(config_names, 93)
     for i,chunk in enumerate(config_chunks):
         #generate bash script to run all the configs on the hpcc
         with open(f"experiments/run_experiments_hpcc{i}", "w") as f:
             f.write("cd {}\n".format(save_dir))
-            f.write("cp {}/main.py .\n".format(cwd+"/graph-evolution")+
-                    "cp {}/ga.py .\n".format(cwd+"/graph-evolution")+
-                    "cp {}/eval_functions.py .\n".format(cwd+"/graph-evolution")+
-                    "cp {}/organism.py .\n".format(cwd+"/graph-evolution")+
-                    "cp {}/bintools.py .\n".format(cwd+"/graph-evolution")+
-                    "cp {}/plot_utils.py .\n".format(cwd+"/graph-evolution"))
+            for source_file in SOURCE_FILES:
+                f.write("cp {}/graph-evolution/{} .\n".format(cwd, source_file))
+            f.write("mkdir -p logs\n")
+            #each task logs to logs/[config]_[rep].out, so resubmit_iter can tell which tasks timed out or ran out of memory
             for config_name in chunk:
-                f.write("sbatch {}/experiments/hpcc.sb {}.json\n".format(cwd, config_name))
+                f.write("sbatch --job-name={} {}/experiments/hpcc.sb {}.json\n".format(config_name, cwd, config_name))
+
+
+def generate_analysis_scripts(exp_dir, config_names, save_dir):
+    config_chunks = chunks(config_names, 93)
+    for i,chunk in enumerate(config_chunks):
         #generate bash script to analyze the runs when they are all done
         with open(f"experiments/analyze_experiments{i}", "w") as f:
             for config_name in chunk:
                 f.write("python3 graph-evolution/replicate_analysis.py {}/{}/{}\n".format(save_dir, exp_dir, config_name))
 
 
-def iteration_experiment(exp_dir):
-    config_names = []
-    for network_size in [10, 50, 100]:
-        ns_inv = 1/network_size
-        if network_size == 10:
-            basically_exp = [ns_inv*np.floor(expon.pdf(x, loc=1, scale=network_size/5)/ns_inv) for x in range(network_size+1)]
+ALIASES_PATH = "experiments/configs/aliases.json"
+#the aggregator evaluates large sparse graphs with scipy.sparse, so sizes in the 500-1000 range can be added here
+NETWORK_SIZES = [10, 50, 100]
+#rough seconds per unit of num_generations * popsize * network_size^2 * (objectives+1), calibrate from finished runs
+SECONDS_PER_UNIT = 1.5e-6
+NUM_REPS = 10
+#graph-evolution files every launch script copies into the save directory before running main.py
+SOURCE_FILES = ["main.py", "ga.py", "eval_functions.py", "organism.py", "bintools.py", "plot_utils.py"]
+#the (config name, rep) pairs each bundle job runs, so resubmit_iter can find the job output of a rep
+BUNDLES_PATH = "experiments/bundles/bundles.json"
+
+
+def load_config(config_name):
+    with open("experiments/configs/{}.json".format(config_name)) as f:
+        return json.load(f)
+
+
+def load_config_names():
+    #names of the configs iteration_experiment wrote, without rewriting them
+    if os.path.exists(ALIASES_PATH):
+        with open(ALIASES_PATH) as f:
+            return list(json.load(f))
+    return sorted(os.path.splitext(file_name)[0] for file_name in os.listdir("experiments/configs")
+                  if file_name.endswith(".json") and file_name != os.path.basename(ALIASES_PATH))
+
+
+def estimate_cost(config):
+    #estimated seconds for one rep of a config
+    units = config["num_generations"] * config["popsize"] * config["network_size"]**2 * (len(config["eval_funcs"])+1)
+    return units * SECONDS_PER_UNIT
+
+
+def pack_bundles(tasks, cores, wall_time):
+    #longest first, each task goes to the least loaded core of the first bundle it fits in
+    #tasks are (cost, config_name, rep), each bundle is a list of cores and each core a list of tasks
+    bundles = []
+    loads = []
+    for task in sorted(tasks, reverse=True):
+        cost = task[0]
+        if cost > wall_time:
+            print("{} rep {} is estimated to take longer than the wall time".format(task[1], task[2]))
+        for bundle,load in zip(bundles, loads):
+            core = int(np.argmin(load))
+            if load[core] + cost <= wall_time:
+                break
         else:
-            basically_exp = [ns_inv*np.round(expon.pdf(x, loc=1, scale=network_size/5)/ns_inv) for x in range(network_size+1)]
-        basically_norm = [ns_inv*np.round(norm.pdf(x, loc=network_size/4, scale=network_size/10)/ns_inv) for x in range(network_size+1)]
+            bundle = [[] for _ in range(cores)]
+            load = [0.0]*cores
+            bundles.append(bundle)
+            loads.append(load)
+            core = 0
+        bundle[core].append(task)
+        load[core] += cost
+    return bundles, loads
+
+
+def slurm_time(seconds):
+    minutes = int(np.ceil(seconds/60))
+    return "{}-{:02d}:{:02d}".format(minutes // 1440, (minutes % 1440) // 60, minutes % 60)
+
+
+def generate_bundled_scripts(config_names, save_dir, cores=32, wall_time_hours=72):
+    #pack config reps into jobs that run them concurrently on one node's cores, each under the wall time
+    cwd = os.getcwd()
+    wall_time = wall_time_hours*3600
+    tasks = []
+    for config_name in config_names:
+        cost = estimate_cost(load_config(config_name))
+        tasks.extend((cost, config_name, rep) for rep in range(NUM_REPS))
+    bundles, loads = pack_bundles(tasks, cores, wall_time)
+
+    if not os.path.exists("experiments/bundles"):
+        os.makedirs("experiments/bundles")
+    with open("experiments/run_bundles_hpcc", "w") as run_file:
+        run_file.write("cd {}\n".format(save_dir))
+        for source_file in SOURCE_FILES:
+            run_file.write("cp {}/graph-evolution/{} .\n".format(cwd, source_file))
+        #reps and bundle jobs log to save_dir/logs like hpcc.sb tasks, where resubmit_iter looks for why they failed
+        run_file.write("mkdir -p logs\n")
+        for i,(bundle,load) in enumerate(zip(bundles, loads)):
+            used_cores = [core for core in bundle if len(core) > 0]
+            #leave headroom over the estimate, but never ask for more than the wall time allows
+            job_time = min(wall_time, 1.5*max(load)+600)
+            with open("experiments/bundles/bundle{}.sb".format(i), "w") as f:
+                f.write("#!/bin/sh\n\n")
+                f.write("#SBATCH -A ecode\n")
+                f.write("#SBATCH --job-name=graph_evolution_bundle{}\n".format(i))
+                f.write("#SBATCH -o logs/ga_bundle{}_%j.out\n".format(i))
+                f.write("#SBATCH --time={}\n".format(slurm_time(job_time)))
+                f.write("#SBATCH --nodes=1\n")
+                f.write("#SBATCH --ntasks=1\n")
+                f.write("#SBATCH --cpus-per-task={}\n".format(len(used_cores)))
+                f.write("#SBATCH --mem-per-cpu=2gb\n\n")
+                for core in used_cores:
+                    runs = ["python3 main.py {}/experiments/configs/{}.json {} > logs/{}_{}.out 2>&1".format(cwd, config_name, rep, config_name, rep)
+                            for _,config_name,rep in core]
+                    f.write("({}) &\n".format("; ".join(runs)))
+                f.write("wait\n")
+            run_file.write("sbatch {}/experiments/bundles/bundle{}.sb\n".format(cwd, i))
+    with open(BUNDLES_PATH, "w") as f:
+        json.dump([[[config_name, rep] for core in bundle for _,config_name,rep in core] for bundle in bundles], f)
+    print("{} reps packed into {} jobs".format(len(tasks), len(bundles)))
+
+
+def rep_done(save_dir, exp_dir, config_name, rep):
+    return os.path.exists("{}/{}/{}/{}/final_pop.pkl".format(save_dir, exp_dir, config_name, rep))
+
+
+def run_rep(config_name, rep, save_dir):
+    #run graph-evolution in place, main.py puts its own directory on the path so nothing needs copying
+    cwd = os.getcwd()
+    start = time.time()
+    with open("{}/logs/{}_{}.out".format(save_dir, config_name, rep), "w") as log:
+        result = subprocess.run(["python3", "{}/graph-evolution/main.py".format(cwd),
+                                 "{}/experiments/configs/{}.json".format(cwd, config_name), str(rep)],
+                                cwd=save_dir, stdout=log, stderr=subprocess.STDOUT)
+    return result.returncode, time.time()-start
+
+
+def run_local(exp_dir, config_names, save_dir, num_workers=None):
+    #run every config x rep on this machine, longest first, skipping reps that already finished
+    num_workers = num_workers or os.cpu_count()
+    tasks = []
+    for config_name in config_names:
+        cost = estimate_cost(load_config(config_name))
+        tasks.extend((cost, config_name, rep) for rep in range(NUM_REPS) if not rep_done(save_dir, exp_dir, config_name, rep))
+    tasks.sort(reverse=True)
+    if not os.path.exists("{}/logs".format(save_dir)):
+        os.makedirs("{}/logs".format(save_dir))
+    print("{} of {} reps left to run on {} workers".format(len(tasks), len(config_names)*NUM_REPS, num_workers))
+
+    start = time.time()
+    remaining_cost = sum(task[0] for task in tasks)
+    done_cost = 0
+    failed = []
+    #each worker thread only waits on its own main.py process, so threads bound the number of concurrent runs
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        futures = {executor.submit(run_rep, config_name, rep, save_dir):(cost, config_name, rep) for cost,config_name,rep in tasks}
+        for i,future in enumerate(as_completed(futures)):
+            cost, config_name, rep = futures[future]
+            returncode, seconds = future.result()
+            if returncode != 0:
+                failed.append((config_name, rep))
+            done_cost += cost
+            remaining_cost -= cost
+            elapsed = time.time()-start
+            eta = elapsed*remaining_cost/done_cost if done_cost > 0 else 0
+            print("[{}/{}] {} rep {} {} in {:.0f}s, {:.1f} reps/hour, eta {}".format(
+                i+1, len(tasks), config_name, rep, "failed" if returncode else "finished",
+                seconds, 3600*(i+1)/elapsed, slurm_time(eta)))
+    for config_name,rep in failed:
+        print("Failed {} rep {}".format(config_name, rep))
+
+
+def iteration_combos(network_sizes=NETWORK_SIZES):
+    #lazily yields (label, network_size, eval_funcs) for every objective combination of the iteration experiment
+    for network_size in network_sizes:
+        basically_exp = exponential_target(network_size)
+        basically_norm = normal_target(network_size)
         eval_funcs = [
         {
             "in_degree_distribution": {"target": basically_exp},
@@ -96,25 +278,50 @@ def iteration_experiment(exp_dir):
         ]
         for i in range(1,6):
             for j,eval_func in enumerate(eval_funcs):
-                combo = list(combinations(eval_func, i))
-                for k,c in enumerate(combo):
-                    new_eval_func = {c[x]:eval_func[c[x]] for x in range(len(c))}
-                    config_name = experiment_config(exp_dir, "{}_{}_{}".format(i, j, k), new_eval_func, network_size)
-                    config_names.append(config_name)
+                for k,c in enumerate(combinations(eval_func, i)):
+                    yield "{}_{}_{}".format(i, j, k), network_size, {objective:eval_func[objective] for objective in c}
+
+
+def iteration_experiment(exp_dir, network_sizes=NETWORK_SIZES):
+    config_names = []
+    config_hashes = {}
+    aliases = {}
+    for label,network_size,new_eval_func in iteration_combos(network_sizes):
+        config_name = experiment_config(exp_dir, label, new_eval_func, network_size, config_hashes)
+        if config_name not in aliases:
+            config_names.append(config_name)
+            aliases[config_name] = []
+        aliases[config_name].append("{}_{}".format(label, network_size))
+    #identical configs are run once under the first name, the aggregator copies their results to every label
+    with open(ALIASES_PATH, "w") as f:
+        json.dump(aliases, f, indent=4)
+    print("{} duplicate configs".format(sum(len(labels)-1 for labels in aliases.values())))
     return config_names
 
 
-def main(save_dir):
+def main(save_dir, backend="hpcc", num_workers=None):
     if not os.path.exists("experiments/configs"):
         os.makedirs("experiments/configs")
     experiment_name = "iter_final"
     config_names = iteration_experiment(experiment_name)
     print(len(config_names))
-    generate_scripts(experiment_name, config_names, save_dir)
+    if backend == "local":
+        run_local(experiment_name, config_names, save_dir, num_workers)
+        return
+    generate_analysis_scripts(experiment_name, config_names, save_dir)
+    #the bundles already run every rep, so their backend gets no per-config scripts that could submit them a second time
+    if backend == "bundle":
+        generate_bundled_scripts(config_names, save_dir)
+    else:
+        generate_scripts(config_names, save_dir)
 
 
 if __name__ == "__main__":
     if len(sys.argv) == 2:
         main(sys.argv[1])
+    elif len(sys.argv) == 3 and sys.argv[2] == "bundle":
+        main(sys.argv[1], backend="bundle")
+    elif len(sys.argv) in (3, 4) and sys.argv[2] == "local":
+        main(sys.argv[1], backend="local", num_workers=int(sys.argv[3]) if len(sys.argv) == 4 else None)
     else:
         print("Please provide a directory to save the output of the graph-evolution runs in.")
\ No newline at end of file
@@ -0,0 +1,244 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import json
+import os
+import pickle
+
+import pandas as pd
+
+from generate_configs_iter import NUM_REPS
+from instrument import enabled, profile_rep, report, start_run
+from results_store import load_schema, read_store, write_store
+from schema import FrameBuilder
+
+
+#written by generate_configs_iter, maps each deduplicated run to every (set, combo) label sharing its config
+ALIASES_PATH = "experiments/configs/aliases.json"
+#graph-evolution writes final_pop.pkl last, so a rep without it has not finished
+DONE_FILE = "final_pop.pkl"
+_aliases = None
+
+
+def load_aliases():
+    global _aliases
+    if _aliases is None:
+        _aliases = {}
+        if os.path.exists(ALIASES_PATH):
+            with open(ALIASES_PATH) as f:
+                _aliases = json.load(f)
+    return _aliases
+
+
+_experiment_dirs = {}
+
+
+def experiment_dirs(data_dir):
+    #names of the run directories under data_dir, listed once per process
+    if data_dir not in _experiment_dirs:
+        _experiment_dirs[data_dir] = set(name for name in os.listdir(data_dir) if os.path.isdir("{}/{}".format(data_dir, name)))
+    return _experiment_dirs[data_dir]
+
+
+def experiment_labels(experiment_dir, found_dirs=()):
+    #data from before deduplication has a run directory for every label, those labels are read from their own runs
+    #instead of getting a copy of this one
+    labels = load_aliases().get(experiment_dir, [experiment_dir])
+    return [label for label in labels if label == experiment_dir or label not in found_dirs]
+
+
+def fan_out_rows(df_rows, experiment_dir, found_dirs=()):
+    #copy a run's rows to every label that shares its config, rows start with experiment_name, num_obj, iter_path, combo
+    #found_dirs are the run directories that exist, see experiment_labels
+    labels = experiment_labels(experiment_dir, found_dirs)
+    if labels == [experiment_dir]:
+        return df_rows
+    fanned_rows = []
+    for label in labels:
+        num_obj, iter_path, combo, _ = label.split("_")
+        fanned_rows.extend([label, num_obj, iter_path, combo] + row[4:] for row in df_rows)
+    return fanned_rows
+
+
+def list_rep_dirs(data_dir, completed_only=True):
+    #yield every rep directory as (experiment_dir, rep_dir, full_rep_path), unfinished reps are skipped unless completed_only is False
+    for experiment_dir in sorted(os.listdir(data_dir)):
+        full_obj_path = "{}/{}".format(data_dir, experiment_dir)
+        if not os.path.isfile(full_obj_path):
+            for rep_dir in sorted(os.listdir(full_obj_path)):
+                full_rep_path = "{}/{}".format(full_obj_path, rep_dir)
+                if not os.path.isfile(full_rep_path):
+                    if completed_only and not os.path.exists("{}/{}".format(full_rep_path, DONE_FILE)):
+                        print("Skipped {} rep {}".format(experiment_dir, rep_dir))
+                        continue
+                    yield experiment_dir, rep_dir, full_rep_path
+
+
+def check_pickle(file_path):
+    #cheap checks that catch files cut off by a job hitting its wall time, returns a reason code or None
+    if not os.path.exists(file_path):
+        return "missing_file"
+    size = os.path.getsize(file_path)
+    if size == 0:
+        return "empty_file"
+    with open(file_path, "rb") as f:
+        header = f.read(2)
+        f.seek(-1, os.SEEK_END)
+        tail = f.read(1)
+    if len(header) < 2 or header[0] != 0x80 or header[1] > pickle.HIGHEST_PROTOCOL:
+        return "bad_header"
+    #every pickle ends with the STOP opcode
+    if tail != b".":
+        return "truncated"
+    return None
+
+
+def check_rep(args):
+    full_rep_path, file_names = args
+    for file_name in file_names:
+        reason = check_pickle("{}/{}".format(full_rep_path, file_name))
+        if reason is not None:
+            return "{}:{}".format(reason, file_name)
+    return None
+
+
+def check_reps(reps, file_names, num_workers=1):
+    #returns the reason code of each rep, checks only read a few bytes so threads are enough
+    file_names = [DONE_FILE] + [file_name for file_name in file_names if file_name != DONE_FILE]
+    tasks = [(full_rep_path, file_names) for _, _, full_rep_path in reps]
+    with ThreadPoolExecutor(max_workers=max(1, num_workers)) as executor:
+        return list(executor.map(check_rep, tasks))
+
+
+def rep_signature(full_rep_path, file_names):
+    #mtime and size of every file a rep reader opens, used to detect new or changed reps
+    signature = []
+    for file_name in file_names:
+        file_path = "{}/{}".format(full_rep_path, file_name)
+        if os.path.exists(file_path):
+            stat = os.stat(file_path)
+            signature.append([file_name, stat.st_mtime_ns, stat.st_size])
+        else:
+            signature.append([file_name, -1, -1])
+    return signature
+
+
+def manifest_path(store_path):
+    return "{}_manifest.json".format(store_path)
+
+
+def load_manifest(store_path):
+    path = manifest_path(store_path)
+    if not os.path.exists(path) or not os.path.exists(store_path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(store_path, manifest):
+    with open(manifest_path(store_path), "w") as f:
+        json.dump(manifest, f)
+
+
+def _read_rep(args):
+    read_rep, experiment_dir, rep_dir, full_rep_path, catch_errors = args
+    with profile_rep(experiment_dir, rep_dir):
+        if not catch_errors:
+            return read_rep(experiment_dir, rep_dir, full_rep_path)
+        try:
+            return (experiment_dir, rep_dir), read_rep(experiment_dir, rep_dir, full_rep_path), None
+        except Exception as e:
+            return (experiment_dir, rep_dir), None, "read_error:{}".format(type(e).__name__)
+
+
+def read_reps(read_rep, reps, num_workers=1, catch_errors=False):
+    #yields the output of read_rep for each rep in order,
+    #or ((experiment_dir, rep_dir), output, reason code) if catch_errors is set
+    #reps of the same experiment are adjacent, so chunking keeps per-experiment caches warm in each worker
+    tasks = [(read_rep, experiment_dir, rep_dir, full_rep_path, catch_errors)
+             for experiment_dir, rep_dir, full_rep_path in reps]
+    run_id = start_run() if enabled() else None
+    if num_workers <= 1 or len(tasks) <= 1:
+        yield from map(_read_rep, tasks)
+    else:
+        chunksize = max(1, len(tasks) // (num_workers*4))
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            yield from executor.map(_read_rep, tasks, chunksize=chunksize)
+    if run_id is not None:
+        report(run_id)
+
+
+def coverage_path(store_path):
+    return "{}_coverage.csv".format(store_path)
+
+
+def save_coverage(data_dir, store_path, quarantined, num_reps=NUM_REPS):
+    #every (config, rep) without usable results, with why, so they can be resubmitted
+    #configs come from the aliases file when there is one, so configs that never started are listed too
+    found = {}
+    for experiment_dir, rep_dir, _ in list_rep_dirs(data_dir, completed_only=False):
+        found.setdefault(experiment_dir, set()).add(rep_dir)
+    configs = sorted(set(load_aliases()) | set(found))
+    rows = []
+    for config in configs:
+        for rep in range(num_reps):
+            if (config, str(rep)) in quarantined:
+                rows.append([config, rep, quarantined[(config, str(rep))]])
+            elif str(rep) not in found.get(config, ()):
+                rows.append([config, rep, "missing_rep"])
+    coverage = pd.DataFrame(data=rows, columns=["config", "rep", "reason"])
+    coverage.to_csv(coverage_path(store_path), index=False)
+    if len(coverage) > 0:
+        print("{} of {} reps missing or quarantined, see {}".format(len(coverage), len(configs)*num_reps,
+                                                                   coverage_path(store_path)))
+    return coverage
+
+
+def ingest(data_dir, read_rep, columns, store_path, file_names, num_workers=1):
+    #read only reps that are new or changed since the last run and merge them into the saved results store
+    #columns are (name, dtype) pairs from schema
+    old_manifest = load_manifest(store_path)
+    if old_manifest and load_schema(store_path)["columns"] != [name for name,_ in columns]:
+        print("Columns changed, rebuilding {}".format(store_path))
+        old_manifest = {}
+    new_manifest = {}
+    to_read = []
+    #reps that are unfinished, cut off or unreadable are left out of the store and the manifest, so they are retried next time
+    quarantined = {}
+    reps = list(list_rep_dirs(data_dir, completed_only=False))
+    _experiment_dirs.pop(data_dir, None)
+    found_dirs = experiment_dirs(data_dir)
+    own_runs = sorted(set(label for labels in load_aliases().values() for label in labels[1:]) & found_dirs)
+    if len(own_runs) > 0:
+        print("{} aliased labels have their own run directories and are read from those instead of copied".format(len(own_runs)))
+    for (experiment_dir, rep_dir, full_rep_path), reason in zip(reps, check_reps(reps, file_names, num_workers)):
+        if reason is not None:
+            quarantined[(experiment_dir, rep_dir)] = reason
+            continue
+        key = "{}/{}".format(experiment_dir, rep_dir)
+        signature = rep_signature(full_rep_path, file_names)
+        new_manifest[key] = signature
+        if old_manifest.get(key) != signature:
+            to_read.append((experiment_dir, rep_dir, full_rep_path))
+    stale = set(old_manifest) - set(new_manifest)
+    stale.update("{}/{}".format(experiment_dir, rep_dir) for experiment_dir, rep_dir, _ in to_read)
+    stale = set("{}/{}".format(label, key.split("/")[1]) for key in stale for label in experiment_labels(key.split("/")[0], found_dirs))
+    print("Reading {} of {} reps".format(len(to_read), len(new_manifest)))
+
+    builder = FrameBuilder(columns, capacity=max(1, len(to_read)))
+    for (experiment_dir, rep_dir), rows, reason in read_reps(read_rep, to_read, num_workers, catch_errors=True):
+        if reason is not None:
+            quarantined[(experiment_dir, rep_dir)] = reason
+            del new_manifest["{}/{}".format(experiment_dir, rep_dir)]
+            continue
+        builder.extend(rows)
+    df = builder.frame()
+
+    if old_manifest:
+        old_df = read_store(store_path)
+        old_keys = old_df["experiment_name"].astype(str) + "/" + old_df["rep"].astype(str)
+        old_df = old_df[~old_keys.isin(stale)]
+        df = pd.concat([old_df, df], ignore_index=True)
+
+    write_store(df, store_path)
+    save_manifest(store_path, new_manifest)
+    save_coverage(data_dir, store_path, quarantined)
+    return df
@@ -0,0 +1,107 @@
+from contextlib import contextmanager
+import json
+import os
+import time
+import tracemalloc
+
+
+#opt-in stage timers for ingestion, enabled with AGG_PROFILE=1 (or --profile on the agg_scores_iter command line)
+#AGG_PROFILE_MEMORY=1 also records the peak traced allocation of each stage
+#each worker appends one JSON line per rep to experiments/profile/[run id]/[pid].jsonl
+PROFILE_DIR = "experiments/profile"
+_rep = None
+
+
+def enabled():
+    return os.environ.get("AGG_PROFILE", "0") != "0"
+
+
+def memory_enabled():
+    return os.environ.get("AGG_PROFILE_MEMORY", "0") != "0"
+
+
+def start_run():
+    #set in the environment so worker processes log to the same run
+    run_id = time.strftime("%Y%m%d-%H%M%S")
+    os.environ["AGG_PROFILE_RUN"] = run_id
+    os.makedirs("{}/{}".format(PROFILE_DIR, run_id), exist_ok=True)
+    return run_id
+
+
+@contextmanager
+def profile_rep(experiment_dir, rep_dir):
+    global _rep
+    if not enabled():
+        yield
+        return
+    if memory_enabled() and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _rep = {"experiment": experiment_dir, "rep": rep_dir, "pid": os.getpid(), "stages": {}}
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _rep["seconds"] = time.perf_counter() - start
+        log_path = "{}/{}/{}.jsonl".format(PROFILE_DIR, os.environ["AGG_PROFILE_RUN"], os.getpid())
+        with open(log_path, "a") as f:
+            f.write(json.dumps(_rep) + "\n")
+        _rep = None
+
+
+@contextmanager
+def stage(name):
+    if _rep is None:
+        yield
+        return
+    if memory_enabled():
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record = _rep["stages"].setdefault(name, {"seconds": 0.0, "calls": 0})
+        record["seconds"] += time.perf_counter() - start
+        record["calls"] += 1
+        if memory_enabled():
+            record["peak_mb"] = max(record.get("peak_mb", 0), tracemalloc.get_traced_memory()[1] / 2**20)
+
+
+def report(run_id, top=10):
+    #print and save the total time per stage and the slowest reps and experiments of a run
+    run_dir = "{}/{}".format(PROFILE_DIR, run_id)
+    records = []
+    for file_name in os.listdir(run_dir):
+        if file_name.endswith(".jsonl"):
+            with open("{}/{}".format(run_dir, file_name)) as f:
+                records.extend(json.loads(line) for line in f)
+    if len(records) == 0:
+        return
+
+    stages = {}
+    experiments = {}
+    for record in records:
+        for name,stage_record in record["stages"].items():
+            totals = stages.setdefault(name, {"seconds": 0.0, "calls": 0, "peak_mb": 0})
+            totals["seconds"] += stage_record["seconds"]
+            totals["calls"] += stage_record["calls"]
+            totals["peak_mb"] = max(totals["peak_mb"], stage_record.get("peak_mb", 0))
+        experiment = experiments.setdefault(record["experiment"], {"seconds": 0.0, "reps": 0, "stages": {}})
+        experiment["seconds"] += record["seconds"]
+        experiment["reps"] += 1
+        for name,stage_record in record["stages"].items():
+            experiment["stages"][name] = experiment["stages"].get(name, 0) + stage_record["seconds"]
+
+    slowest_reps = sorted(records, key=lambda record: record["seconds"], reverse=True)[:top]
+    slowest_experiments = sorted(experiments.items(), key=lambda item: item[1]["seconds"], reverse=True)[:top]
+    summary = {"reps": len(records), "stages": stages, "slowest_reps": slowest_reps,
+               "slowest_experiments": [dict(experiment=name, **experiment) for name,experiment in slowest_experiments]}
+    with open("{}/report.json".format(run_dir), "w") as f:
+        json.dump(summary, f, indent=4)
+
+    print("Profiled {} reps, saved to {}".format(len(records), run_dir))
+    for name,totals in sorted(stages.items(), key=lambda item: item[1]["seconds"], reverse=True):
+        print("  {:<40} {:>10.2f}s {:>8} calls {:>8.1f} MB peak".format(name, totals["seconds"], totals["calls"], totals["peak_mb"]))
+    print("Slowest experiments:")
+    for name,experiment in slowest_experiments:
+        slowest_stage = max(experiment["stages"], key=experiment["stages"].get) if experiment["stages"] else ""
+        print("  {:<20} {:>10.2f}s over {} reps, mostly {}".format(name, experiment["seconds"], experiment["reps"], slowest_stage))
@@ -0,0 +1,88 @@
+import os
+import pickle
+
+import numpy as np
+
+from ingest import list_rep_dirs, read_reps
+from property_cache import GENOME_DTYPE
+
+
+#final populations stored as one contiguous (popsize, network_size, network_size) block next to final_pop.pkl,
+#so readers can memory-map genomes instead of unpickling every Organism
+POP_FILE = "final_pop.npy"
+
+
+class OrganismView:
+    #exposes an organism's genome and size straight from the memory-mapped block,
+    #any other attribute loads the pickled organism it came from
+    def __init__(self, population, i):
+        self._population = population
+        self._i = i
+
+    @property
+    def genome(self):
+        return self._population.genomes[self._i]
+
+    @property
+    def numNodes(self):
+        return self._population.genomes.shape[1]
+
+    def __getattr__(self, name):
+        return getattr(self._population.organism(self._i), name)
+
+
+class PopulationView:
+    def __init__(self, full_rep_path):
+        self.full_rep_path = full_rep_path
+        self.genomes = np.load("{}/{}".format(full_rep_path, POP_FILE), mmap_mode="r")
+        self._organisms = None
+
+    def __len__(self):
+        return len(self.genomes)
+
+    def __getitem__(self, i):
+        if i < 0 or i >= len(self):
+            raise IndexError(i)
+        return OrganismView(self, i)
+
+    def organism(self, i):
+        if self._organisms is None:
+            with open("{}/final_pop.pkl".format(self.full_rep_path), "rb") as f:
+                self._organisms = pickle.load(f)
+        return self._organisms[i]
+
+
+def is_converted(full_rep_path):
+    pop_path = "{}/{}".format(full_rep_path, POP_FILE)
+    pkl_path = "{}/final_pop.pkl".format(full_rep_path)
+    return os.path.exists(pop_path) and os.path.getmtime(pop_path) >= os.path.getmtime(pkl_path)
+
+
+def convert_population(full_rep_path):
+    with open("{}/final_pop.pkl".format(full_rep_path), "rb") as f:
+        final_pop = pickle.load(f)
+    genomes = np.stack([np.asarray(org.genome, dtype=GENOME_DTYPE) for org in final_pop])
+    #np.save appends .npy to names without it, so the temporary file keeps the extension
+    tmp_path = "{}/final_pop.tmp.npy".format(full_rep_path)
+    np.save(tmp_path, genomes)
+    os.replace(tmp_path, "{}/{}".format(full_rep_path, POP_FILE))
+
+
+def convert_rep(experiment_dir, rep_dir, full_rep_path):
+    if is_converted(full_rep_path):
+        return False
+    convert_population(full_rep_path)
+    return True
+
+
+def convert_populations(data_dir, num_workers=1):
+    converted = sum(read_reps(convert_rep, list_rep_dirs(data_dir), num_workers))
+    print("Converted {} populations".format(converted))
+
+
+def load_population(full_rep_path):
+    #memory-mapped view when the population has been converted, otherwise the pickled organisms
+    if is_converted(full_rep_path):
+        return PopulationView(full_rep_path)
+    with open("{}/final_pop.pkl".format(full_rep_path), "rb") as f:
+        return pickle.load(f)
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+
+#property values of evaluated organisms keyed by (genome hash, property, eval config), so reruns of save_entropy
+#only evaluate organisms and properties they have not seen before
+CACHE_PATH = "experiments/property_cache.sqlite"
+MAX_ENTRIES = 5000000
+#how many writes happen between checks of the cache size
+EVICT_EVERY = 100
+#genomes are hashed and evaluated as float32, the dtype converted populations are saved in,
+#so a genome has the same key and property values whether it was read from final_pop.pkl or final_pop.npy
+GENOME_DTYPE = np.float32
+
+
+def genome_key(genome):
+    genome = np.ascontiguousarray(genome, dtype=GENOME_DTYPE)
+    return hashlib.sha1(str(genome.shape).encode() + genome.tobytes()).hexdigest()
+
+
+def eval_config_key(config):
+    #property values do not depend on where a run was saved or what it was called
+    content = {key:value for key,value in config.items() if key not in ("name", "data_dir")}
+    return hashlib.sha1(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+class PropertyCache:
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.writes = 0
+        self.conn = sqlite3.connect(path, timeout=600)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS cache (genome TEXT, property TEXT, config TEXT, value TEXT, "
+                          "last_used INTEGER, PRIMARY KEY (genome, property, config))")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS cache_last_used ON cache (last_used)")
+        self.conn.commit()
+
+    def get_many(self, genome_keys, property, config_key):
+        #returns {genome key: value} for the keys that are cached, and marks them as recently used
+        values = {}
+        for i in range(0, len(genome_keys), 500):
+            batch = genome_keys[i:i+500]
+            rows = self.conn.execute("SELECT genome, value FROM cache WHERE property = ? AND config = ? AND genome IN ({})".format(
+                                     ",".join("?"*len(batch))), [property, config_key] + batch).fetchall()
+            values.update((genome, json.loads(value)) for genome,value in rows)
+        if values:
+            self.conn.executemany("UPDATE cache SET last_used = ? WHERE genome = ? AND property = ? AND config = ?",
+                                  [(time.time_ns(), genome, property, config_key) for genome in values])
+            self.conn.commit()
+        return values
+
+    def put_many(self, items):
+        #items are (genome key, property, config key, value)
+        now = time.time_ns()
+        self.conn.executemany("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+                              [(genome, property, config_key, json.dumps(np.asarray(value).tolist()), now)
+                               for genome,property,config_key,value in items])
+        self.conn.commit()
+        self.writes += 1
+        if self.writes % EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self):
+        #drop the least recently used entries once the cache is over its size limit
+        count = self.conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute("DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache ORDER BY last_used LIMIT ?)",
+                              [count - self.max_entries])
+            self.conn.commit()
+
+
+_cache = None
+_cache_pid = None
+
+
+def get_cache():
+    #sqlite connections cannot be shared across forked workers, so each process opens its own
+    global _cache, _cache_pid
+    if _cache is None or _cache_pid != os.getpid():
+        _cache = PropertyCache()
+        _cache_pid = os.getpid()
+    return _cache
@@ -0,0 +1,62 @@
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import os
+
+import matplotlib
+import pandas as pd
+
+
+#hash of the data and arguments each figure was last drawn from, keyed by output file
+RENDER_MANIFEST = "experiments/render_manifest.json"
+
+
+def figure_hash(plot_func, args):
+    sha = hashlib.sha1(plot_func.__name__.encode())
+    for arg in args:
+        if isinstance(arg, pd.DataFrame):
+            sha.update(pd.util.hash_pandas_object(arg, index=False).values.tobytes())
+            sha.update(",".join(arg.columns).encode())
+        else:
+            sha.update(repr(arg).encode())
+    return sha.hexdigest()
+
+
+def _use_agg():
+    matplotlib.use("Agg")
+
+
+def _render(job):
+    _, plot_func, args = job
+    plot_func(*args)
+
+
+def render_figures(jobs, num_workers=1):
+    #jobs are (output_path, plot_func, args), figures whose inputs have not changed since the last render are skipped
+    manifest = {}
+    if os.path.exists(RENDER_MANIFEST):
+        with open(RENDER_MANIFEST) as f:
+            manifest = json.load(f)
+    hashes = {}
+    to_render = []
+    for job in jobs:
+        output_path, plot_func, args = job
+        hashes[output_path] = figure_hash(plot_func, args)
+        if manifest.get(output_path) == hashes[output_path] and os.path.exists(output_path):
+            print("Unchanged {}".format(output_path))
+        else:
+            to_render.append(job)
+
+    if num_workers <= 1:
+        _use_agg()
+        for job in to_render:
+            _render(job)
+            print("Rendered {}".format(job[0]))
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers, initializer=_use_agg) as executor:
+            for job,_ in zip(to_render, executor.map(_render, to_render)):
+                print("Rendered {}".format(job[0]))
+
+    manifest.update({job[0]:hashes[job[0]] for job in to_render})
+    with open(RENDER_MANIFEST, "w") as f:
+        json.dump(manifest, f, indent=4)
@@ -0,0 +1,151 @@
+import glob
+import json
+import os
+import sys
+import time
+
+from generate_configs_iter import BUNDLES_PATH, NUM_REPS, SOURCE_FILES, load_config_names, slurm_time
+from ingest import check_rep
+
+
+#plans reruns of reps that are missing, unfinished or corrupt after a campaign, as sbatch array jobs over only the missing
+#SLURM_ARRAY_TASK_IDs of each config and as local commands, asking for more time or memory for configs that ran out
+HISTORY_PATH = "experiments/resubmit_history.json"
+#what experiments/hpcc.sb asks for
+DEFAULT_TIME = 72*3600
+DEFAULT_MEM_GB = 2
+MAX_TIME = 7*24*3600
+MAX_MEM_GB = 64
+TIME_FACTOR = 1.5
+MEM_FACTOR = 2
+TIMEOUT_PATTERNS = ["DUE TO TIME LIMIT", "TIMEOUT"]
+OOM_PATTERNS = ["oom-kill", "Out Of Memory", "OUT_OF_MEMORY", "MemoryError"]
+REP_FILES = ["final_pop.pkl", "fitness_log.pkl"]
+
+
+def missing_reps(save_dir, exp_dir, config_names):
+    #{config name: {rep: reason}} for every rep that has not finished with readable results
+    missing = {}
+    for config_name in config_names:
+        for rep in range(NUM_REPS):
+            rep_path = "{}/{}/{}/{}".format(save_dir, exp_dir, config_name, rep)
+            reason = check_rep((rep_path, REP_FILES)) if os.path.isdir(rep_path) else "missing_rep"
+            if reason is not None:
+                missing.setdefault(config_name, {})[rep] = reason
+    return missing
+
+
+def last_activity(path):
+    #newest modification time of a directory and the files in it
+    return max([os.path.getmtime(path)] + [os.path.getmtime("{}/{}".format(path, name)) for name in os.listdir(path)])
+
+
+def bundle_job_logs(save_dir):
+    #{(config name, rep): output files of the bundle jobs that ran it}, for campaigns launched with the bundle backend
+    if not os.path.exists(BUNDLES_PATH):
+        return {}
+    with open(BUNDLES_PATH) as f:
+        bundles = json.load(f)
+    job_logs = {}
+    for i,reps in enumerate(bundles):
+        log_paths = sorted(glob.glob("{}/logs/ga_bundle{}_*.out".format(save_dir, i)))
+        for config_name,rep in reps:
+            job_logs[(config_name, rep)] = log_paths
+    return job_logs
+
+
+def failure_reason(save_dir, exp_dir, config_name, rep, reason, time_limit, job_logs=()):
+    #returns "timeout", "oom" or None, and when the evidence for it was written
+    #slurm writes why it killed a task to the task's output file, which hpcc.sb puts in save_dir/logs,
+    #and why it killed a bundle job to that job's output file, given as job_logs
+    for log_path in ["{}/logs/{}_{}.out".format(save_dir, config_name, rep)] + list(job_logs):
+        if not os.path.exists(log_path):
+            continue
+        with open(log_path, errors="replace") as f:
+            log = f.read()
+        if any(pattern in log for pattern in OOM_PATTERNS):
+            return "oom", os.path.getmtime(log_path)
+        if any(pattern in log for pattern in TIMEOUT_PATTERNS):
+            return "timeout", os.path.getmtime(log_path)
+    #results cut off mid write almost always come from a job killed at its wall time
+    if reason.startswith("truncated") or reason.startswith("empty_file"):
+        file_path = "{}/{}/{}/{}/{}".format(save_dir, exp_dir, config_name, rep, reason.split(":")[1])
+        return "timeout", os.path.getmtime(file_path)
+    #the first campaign's slurm output cannot be attributed to a task, but a rep that started and has not written
+    #anything for longer than its job was allowed to run was killed at the time limit
+    rep_path = "{}/{}/{}/{}".format(save_dir, exp_dir, config_name, rep)
+    if reason == "missing_file:final_pop.pkl":
+        written_at = last_activity(rep_path)
+        if time.time() - written_at > time_limit:
+            return "timeout", written_at
+    return None, 0
+
+
+def load_history():
+    if not os.path.exists(HISTORY_PATH):
+        return {}
+    with open(HISTORY_PATH) as f:
+        return json.load(f)
+
+
+def plan(save_dir, exp_dir, config_names):
+    #returns [(config name, missing reps, seconds, memory in gb)] and records the requests for the next round
+    #requests only grow for failures written since the config was last planned, so planning twice does not double them
+    history = load_history()
+    job_logs = bundle_job_logs(save_dir)
+    jobs = []
+    for config_name,reps in sorted(missing_reps(save_dir, exp_dir, config_names).items()):
+        request = history.get(config_name, {"time": DEFAULT_TIME, "mem_gb": DEFAULT_MEM_GB, "planned_at": 0})
+        failures = [failure_reason(save_dir, exp_dir, config_name, rep, reason, request["time"], job_logs.get((config_name, rep), ()))
+                    for rep,reason in reps.items()]
+        failures = set(kind for kind,written_at in failures if written_at > request["planned_at"])
+        if "timeout" in failures:
+            request["time"] = min(MAX_TIME, int(request["time"]*TIME_FACTOR))
+        if "oom" in failures:
+            request["mem_gb"] = min(MAX_MEM_GB, request["mem_gb"]*MEM_FACTOR)
+        request["planned_at"] = time.time()
+        history[config_name] = request
+        jobs.append((config_name, sorted(reps), request["time"], request["mem_gb"]))
+    with open(HISTORY_PATH, "w") as f:
+        json.dump(history, f, indent=4)
+    return jobs
+
+
+def write_scripts(jobs, save_dir):
+    cwd = os.getcwd()
+    with open("experiments/resubmit_hpcc", "w") as f:
+        f.write("cd {}\n".format(save_dir))
+        f.write("mkdir -p logs\n")
+        for source_file in SOURCE_FILES:
+            f.write("cp {}/graph-evolution/{} .\n".format(cwd, source_file))
+        #options given to sbatch override the #SBATCH lines of hpcc.sb
+        for config_name,reps,seconds,mem_gb in jobs:
+            f.write("sbatch --array={} --time={} --mem-per-cpu={}gb --job-name={} {}/experiments/hpcc.sb {}.json\n".format(
+                    ",".join(str(rep) for rep in reps), slurm_time(seconds), mem_gb, config_name, cwd, config_name))
+    with open("experiments/resubmit_local", "w") as f:
+        f.write("cd {}\n".format(save_dir))
+        f.write("mkdir -p logs\n")
+        for config_name,reps,_,_ in jobs:
+            for rep in reps:
+                f.write("python3 {}/graph-evolution/main.py {}/experiments/configs/{}.json {} > logs/{}_{}.out 2>&1\n".format(
+                        cwd, cwd, config_name, rep, config_name, rep))
+
+
+def main(save_dir):
+    experiment_name = "iter_final"
+    config_names = load_config_names()
+    jobs = plan(save_dir, experiment_name, config_names)
+    write_scripts(jobs, save_dir)
+    num_missing = sum(len(reps) for _,reps,_,_ in jobs)
+    print("{} of {} reps missing across {} configs".format(num_missing, len(config_names)*NUM_REPS, len(jobs)))
+    for config_name,reps,seconds,mem_gb in jobs:
+        if seconds != DEFAULT_TIME or mem_gb != DEFAULT_MEM_GB:
+            print("  {} asks for {} and {}gb per cpu".format(config_name, slurm_time(seconds), mem_gb))
+    print("Resubmit with experiments/resubmit_hpcc or run locally with experiments/resubmit_local")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2:
+        main(sys.argv[1])
+    else:
+        print("Please provide the directory the graph-evolution runs were saved in.")
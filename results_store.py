@@ -0,0 +1,120 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+
+#aggregated dataframes are stored one directory per (network_size, iter_path) partition,
+#with one .npy file per column so readers can memory-map only the columns and partitions they need
+PARTITION_COLS = ["network_size", "iter_path"]
+
+
+def _json_value(value):
+    return value.item() if hasattr(value, "item") else value
+
+
+def _partition_dir(store_path, partition_cols, values):
+    return os.path.join(store_path, *["{}={}".format(col, value) for col,value in zip(partition_cols, values)])
+
+
+def load_schema(store_path):
+    with open(os.path.join(store_path, "schema.json")) as f:
+        return json.load(f)
+
+
+def write_store(df, store_path, partition_cols=PARTITION_COLS):
+    #write to a temporary directory first so a crash never leaves a half written store behind
+    tmp_path = "{}.tmp".format(store_path)
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    schema = {"columns": list(df.columns), "partition_cols": partition_cols,
+              "categories": {}, "dtypes": {}, "partitions": []}
+    codes = {}
+    for col in df.columns:
+        if col in partition_cols:
+            schema["dtypes"][col] = "int" if pd.api.types.is_integer_dtype(df[col]) else "str"
+        elif pd.api.types.is_numeric_dtype(df[col]) or pd.api.types.is_bool_dtype(df[col]):
+            schema["dtypes"][col] = df[col].dtype.str
+        else:
+            categories = sorted(df[col].astype(str).unique())
+            schema["categories"][col] = categories
+            codes[col] = pd.Categorical(df[col].astype(str), categories=categories).codes
+
+    if len(df) > 0:
+        for values, index in df.groupby(partition_cols, sort=True, observed=True).indices.items():
+            values = [_json_value(v) for v in values]
+            part_dir = _partition_dir(tmp_path, partition_cols, values)
+            os.makedirs(part_dir)
+            for col in df.columns:
+                if col in partition_cols:
+                    continue
+                column = codes[col] if col in codes else df[col].values
+                np.save(os.path.join(part_dir, "{}.npy".format(col)), np.ascontiguousarray(column[index]))
+            schema["partitions"].append({"values": values, "num_rows": len(index)})
+
+    with open(os.path.join(tmp_path, "schema.json"), "w") as f:
+        json.dump(schema, f)
+    if os.path.exists(store_path):
+        shutil.rmtree(store_path)
+    os.rename(tmp_path, store_path)
+
+
+def _allowed(value):
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+def read_store(store_path, columns=None, filters=None, categorical=True):
+    #filters map a column to a value or list of values; partition columns are pruned without reading any files
+    #numeric columns stay memory-mapped when a single partition is read, and string columns come back as categoricals
+    #sharing the store's categories unless categorical is False
+    schema = load_schema(store_path)
+    partition_cols = schema["partition_cols"]
+    categories = dict(schema["categories"])
+    for col in partition_cols:
+        if schema["dtypes"][col] == "str":
+            categories[col] = sorted(set(partition["values"][partition_cols.index(col)] for partition in schema["partitions"]))
+    columns = list(columns) if columns is not None else schema["columns"]
+    filters = {col:_allowed(value) for col,value in (filters or {}).items()}
+    load_cols = columns + [col for col in filters if col not in columns]
+
+    frames = []
+    for partition in schema["partitions"]:
+        partition_values = dict(zip(partition_cols, partition["values"]))
+        if any(col in partition_values and partition_values[col] not in allowed for col,allowed in filters.items()):
+            continue
+        part_dir = _partition_dir(store_path, partition_cols, partition["values"])
+        num_rows = partition["num_rows"]
+        data = {}
+        for col in load_cols:
+            if col in partition_values:
+                value = partition_values[col]
+                if schema["dtypes"][col] == "int":
+                    data[col] = np.full(num_rows, value, dtype=np.int64)
+                elif categorical:
+                    data[col] = pd.Categorical.from_codes(np.full(num_rows, categories[col].index(value)), categories=categories[col])
+                else:
+                    data[col] = np.full(num_rows, value, dtype=object)
+                continue
+            column = np.load(os.path.join(part_dir, "{}.npy".format(col)), mmap_mode="r")
+            if col in categories:
+                if categorical:
+                    data[col] = pd.Categorical.from_codes(column, categories=categories[col])
+                else:
+                    data[col] = np.asarray(categories[col], dtype=object)[column]
+            else:
+                data[col] = column
+        frame = pd.DataFrame(data, columns=load_cols, copy=False)
+        for col,allowed in filters.items():
+            if col not in partition_values:
+                frame = frame[frame[col].isin(allowed)]
+        frames.append(frame[columns])
+
+    if len(frames) == 0:
+        return pd.DataFrame(columns=columns)
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    return pd.concat(frames, ignore_index=True)
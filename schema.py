@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+
+#short names used in figures and dataframes for each eval function of graph-evolution
+OBJECTIVE_NAMES = {"connectance": "connectance",
+                   "average_positive_interactions_strength": "avg pos",
+                   "average_negative_interactions_strength": "avg neg",
+                   "number_of_competiton_pairs": "recip neg",
+                   "positive_interactions_proportion": "pos prop",
+                   "strong_components": "str comp",
+                   "proportion_of_self_loops": "prop self",
+                   "in_degree_distribution": "in-dd",
+                   "out_degree_distribution": "out-dd"}
+#integer code of each objective, also its bit in an experiment's objective_mask
+OBJECTIVES = list(OBJECTIVE_NAMES.values())
+
+#columns of the aggregated dataframes, "category" columns are integer coded while rows are collected
+FITNESS_COLUMNS = [("experiment_name", "category"), ("num_obj", "category"), ("iter_path", "category"),
+                   ("combo", "category"), ("rep", "category"), ("network_size", np.int64), ("objective", "category"),
+                   ("MSE", np.float64), ("num_generations", np.int64), ("solution_generation", np.int64)]
+ENTROPY_COLUMNS = [("experiment_name", "category"), ("num_obj", "category"), ("iter_path", "category"),
+                   ("combo", "category"), ("rep", "category"), ("network_size", np.int64), ("objective", "category"),
+                   ("under_selection", np.bool_), ("mse", np.float64), ("entropy", np.float64),
+                   ("num_unique", np.int64), ("pop_size", np.int64)]
+
+
+def short_name(objective):
+    return OBJECTIVE_NAMES.get(objective, objective)
+
+
+class FrameBuilder:
+    #collects rows into preallocated typed column buffers and wraps them in a dataframe without copying
+    def __init__(self, columns, capacity=1024):
+        self.columns = columns
+        self.num_rows = 0
+        self.buffers = {}
+        self.codes = {}
+        for name,dtype in columns:
+            if dtype == "category":
+                self.buffers[name] = np.empty(capacity, dtype=np.int32)
+                self.codes[name] = {objective:i for i,objective in enumerate(OBJECTIVES)} if name == "objective" else {}
+            else:
+                self.buffers[name] = np.empty(capacity, dtype=dtype)
+
+    def _grow(self):
+        for name,buffer in self.buffers.items():
+            grown = np.empty(max(1, 2*len(buffer)), dtype=buffer.dtype)
+            grown[:len(buffer)] = buffer
+            self.buffers[name] = grown
+
+    def append(self, row):
+        if self.num_rows == len(self.buffers[self.columns[0][0]]):
+            self._grow()
+        for (name,dtype),value in zip(self.columns, row):
+            if dtype == "category":
+                codes = self.codes[name]
+                if value not in codes:
+                    codes[value] = len(codes)
+                value = codes[value]
+            self.buffers[name][self.num_rows] = value
+        self.num_rows += 1
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def frame(self):
+        data = {}
+        for name,dtype in self.columns:
+            column = self.buffers[name][:self.num_rows]
+            if dtype == "category":
+                data[name] = pd.Categorical.from_codes(column, categories=list(self.codes[name]))
+            else:
+                data[name] = column
+        return pd.DataFrame(data, columns=[name for name,_ in self.columns], copy=False)
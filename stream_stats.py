@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+
+class RunningStats:
+    #count, mean, variance (Welford), min, max and a fixed size uniform reservoir sample of a stream of values
+    def __init__(self, reservoir_size=1000, rng=None):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.reservoir = []
+        self.reservoir_size = reservoir_size
+        self.rng = rng if rng is not None else np.random.default_rng(0)
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self.reservoir) < self.reservoir_size:
+            self.reservoir.append(value)
+        else:
+            i = self.rng.integers(self.count)
+            if i < self.reservoir_size:
+                self.reservoir[i] = value
+
+    def merge(self, other):
+        #combine with another stream (Chan et al.), the reservoir keeps each stream's share of the values
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta**2 * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        values = self.reservoir + other.reservoir
+        weights = np.concatenate([np.full(len(self.reservoir), self.count/max(len(self.reservoir), 1)),
+                                  np.full(len(other.reservoir), other.count/len(other.reservoir))])
+        size = min(self.reservoir_size, len(values))
+        keep = self.rng.choice(len(values), size=size, replace=False, p=weights/weights.sum())
+        self.reservoir = [values[i] for i in keep]
+        self.count = count
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+
+class GroupedStats:
+    #running statistics per group key, coarser tables are built by merging groups so memory only grows with the number of keys
+    def __init__(self, keys, reservoir_size=1000, seed=0):
+        self.keys = keys
+        self.reservoir_size = reservoir_size
+        self.rng = np.random.default_rng(seed)
+        self.groups = {}
+
+    def add(self, key, value):
+        if key not in self.groups:
+            self.groups[key] = RunningStats(self.reservoir_size, self.rng)
+        self.groups[key].add(value)
+
+    def merged(self, by, where=None):
+        #where maps a key column to the values it is allowed to take
+        merged = {}
+        for key,stats in self.groups.items():
+            labels = dict(zip(self.keys, key))
+            if where is not None and any(labels[col] not in allowed for col,allowed in where.items()):
+                continue
+            group = tuple(labels[col] for col in by)
+            if group not in merged:
+                merged[group] = RunningStats(self.reservoir_size, self.rng)
+            merged[group].merge(stats)
+        return merged
+
+    def table(self, by, where=None):
+        merged = self.merged(by, where)
+        rows = [list(group) + [stats.count, stats.mean, stats.variance, stats.min, stats.max] for group,stats in merged.items()]
+        table = pd.DataFrame(data=rows, columns=by + ["count", "mean", "variance", "min", "max"])
+        return table.set_index(by).sort_index()
+
+    def total(self, where=None):
+        return self.merged([], where).get((), RunningStats(self.reservoir_size, self.rng))
@@ -0,0 +1,120 @@
+from itertools import product
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from generate_configs_iter import NETWORK_SIZES, NUM_REPS, build_config, config_hash, iteration_combos
+
+
+#parameter sweeps over the iteration experiment's objective combinations, streamed into one bundle instead of a file per config
+#bundle.jsonl holds one compact config per line and index.npy the byte offset of each line, so any config can be read
+#by its number without scanning the bundle. SLURM array task t runs rep t % NUM_REPS of config t // NUM_REPS
+SWEEP_DIR = "experiments/sweeps"
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+#largest job array most SLURM installs accept
+MAX_ARRAY_SIZE = 1000
+
+
+def sweep_configs(exp_dir, grid, network_sizes=NETWORK_SIZES, aliases=None):
+    #lazily yields each distinct config of every objective combination crossed with every point of grid,
+    #which maps config keys (popsize, mutation_rate, crossover_rate, ...) to the values to try
+    #duplicates are run once under the first name, and aliases collects their labels like aliases.json does
+    keys = list(grid)
+    names = {}
+    for label,network_size,eval_funcs in iteration_combos(network_sizes):
+        for p,values in enumerate(product(*[grid[key] for key in keys])):
+            exp_name = "{}_{}_p{}".format(label, network_size, p)
+            config = build_config(exp_dir, exp_name, eval_funcs, network_size)
+            config.update(zip(keys, values))
+            content_hash = config_hash(config)
+            digest = bytes.fromhex(content_hash)
+            if digest in names:
+                if aliases is not None:
+                    aliases.setdefault(names[digest], [names[digest]]).append(exp_name)
+                continue
+            names[digest] = exp_name
+            config["config_hash"] = content_hash
+            yield config
+
+
+def bundle_paths(sweep_dir):
+    return "{}/bundle.jsonl".format(sweep_dir), "{}/index.npy".format(sweep_dir)
+
+
+def write_bundle(configs, sweep_dir):
+    bundle_path, index_path = bundle_paths(sweep_dir)
+    offsets = []
+    with open(bundle_path, "wb") as f:
+        for config in configs:
+            offsets.append(f.tell())
+            f.write(json.dumps(config, separators=(",", ":")).encode() + b"\n")
+    np.save(index_path, np.array(offsets, dtype=np.uint64))
+    return len(offsets)
+
+
+def read_config(sweep_dir, i):
+    bundle_path, index_path = bundle_paths(sweep_dir)
+    offsets = np.load(index_path, mmap_mode="r")
+    with open(bundle_path, "rb") as f:
+        f.seek(int(offsets[i]))
+        return json.loads(f.readline())
+
+
+def run_task(sweep_dir, task, save_dir):
+    #run one rep of one config of the bundle with graph-evolution, as a job array task would
+    config_index, rep = divmod(task, NUM_REPS)
+    config = read_config(sweep_dir, config_index)
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(config, f)
+    try:
+        result = subprocess.run(["python3", "{}/graph-evolution/main.py".format(REPO_DIR), f.name, str(rep)], cwd=save_dir)
+    finally:
+        os.remove(f.name)
+    return result.returncode
+
+
+def write_sweep_scripts(sweep_dir, num_configs, save_dir):
+    #one job array per MAX_ARRAY_SIZE tasks, each task finds its config and rep from its offset plus its array index
+    sweep_dir = os.path.abspath(sweep_dir)
+    with open("{}/sweep.sb".format(sweep_dir), "w") as f:
+        f.write("#!/bin/sh\n\n")
+        f.write("#SBATCH -A ecode\n")
+        f.write("#SBATCH --job-name=graph_evolution_sweep\n")
+        f.write("#SBATCH -o ga_sweep_%A_%a.out\n")
+        f.write("#SBATCH --time=3-00:00\n")
+        f.write("#SBATCH --mem-per-cpu=2gb\n\n")
+        f.write("python3 {}/sweep_iter.py run {} $(($1 + SLURM_ARRAY_TASK_ID)) {}\n".format(REPO_DIR, sweep_dir, save_dir))
+    num_tasks = num_configs*NUM_REPS
+    with open("{}/run_sweep_hpcc".format(sweep_dir), "w") as f:
+        f.write("cd {}\n".format(save_dir))
+        for offset in range(0, num_tasks, MAX_ARRAY_SIZE):
+            f.write("sbatch --array=0-{} {}/sweep.sb {}\n".format(min(MAX_ARRAY_SIZE, num_tasks-offset)-1, sweep_dir, offset))
+
+
+def main(save_dir, grid_path):
+    sweep_name = os.path.splitext(os.path.basename(grid_path))[0]
+    sweep_dir = "{}/{}".format(SWEEP_DIR, sweep_name)
+    if not os.path.exists(sweep_dir):
+        os.makedirs(sweep_dir)
+    with open(grid_path) as f:
+        grid = json.load(f)
+    aliases = {}
+    num_configs = write_bundle(sweep_configs(sweep_name, grid, aliases=aliases), sweep_dir)
+    with open("{}/aliases.json".format(sweep_dir), "w") as f:
+        json.dump(aliases, f)
+    write_sweep_scripts(sweep_dir, num_configs, save_dir)
+    print("{} configs ({} reps) written to {}, {} duplicates".format(
+          num_configs, num_configs*NUM_REPS, sweep_dir, sum(len(labels)-1 for labels in aliases.values())))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "run":
+        sys.exit(run_task(sys.argv[2], int(sys.argv[3]), sys.argv[4]))
+    elif len(sys.argv) == 3:
+        main(sys.argv[1], sys.argv[2])
+    else:
+        print("Please provide a directory to save the runs in and a JSON file mapping config keys to the values to sweep.")
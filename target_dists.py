@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+
+
+#target degree distributions, the pdf of a distribution over degrees 0..network_size quantized to multiples of 1/network_size
+#every (loc, scale) of a network size is evaluated with one scipy call, and targets are cached on disk by their parameters
+#with one [distribution]_[network size].npz per size holding the (loc, scale) pairs and their targets
+CACHE_DIR = "experiments/target_cache"
+#size 10 exponential targets were floored instead of rounded when the experiments were run, so they sum to at most 1
+FLOOR_SIZES = {"expon": [10], "norm": []}
+_cache = {}
+
+
+def compute_targets(dist, network_size, locs, scales):
+    #one quantized target per (loc, scale) pair, as the rows of a (len(locs), network_size+1) array
+    #scipy.stats is slow to import, so it is only loaded when targets are missing from the cache
+    import scipy.stats
+    locs = np.asarray(locs, dtype=np.float64)[:,None]
+    scales = np.asarray(scales, dtype=np.float64)[:,None]
+    pdf = getattr(scipy.stats, dist).pdf(np.arange(network_size+1)[None,:], loc=locs, scale=scales)
+    ns_inv = 1/network_size
+    if network_size in FLOOR_SIZES[dist]:
+        return ns_inv*np.floor(pdf/ns_inv)
+    return ns_inv*np.round(pdf/ns_inv)
+
+
+def _cache_path(dist, network_size):
+    return "{}/{}_{}.npz".format(CACHE_DIR, dist, network_size)
+
+
+def _load_cache(dist, network_size):
+    if (dist, network_size) not in _cache:
+        rows = {}
+        path = _cache_path(dist, network_size)
+        if os.path.exists(path):
+            saved = np.load(path)
+            rows = {(loc, scale):target for (loc, scale),target in zip(saved["params"].tolist(), saved["targets"])}
+        _cache[(dist, network_size)] = rows
+    return _cache[(dist, network_size)]
+
+
+def targets(dist, params):
+    #params is a list of (network_size, loc, scale), returns the target of each as an array
+    by_size = {}
+    for network_size,loc,scale in params:
+        by_size.setdefault(int(network_size), set()).add((float(loc), float(scale)))
+    for network_size,size_params in by_size.items():
+        rows = _load_cache(dist, network_size)
+        missing = sorted(size_params - set(rows))
+        if len(missing) == 0:
+            continue
+        computed = compute_targets(dist, network_size, [p[0] for p in missing], [p[1] for p in missing])
+        rows.update(zip(missing, computed))
+        if os.path.isdir(os.path.dirname(CACHE_DIR)):
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            np.savez(_cache_path(dist, network_size), params=np.array(list(rows)), targets=np.array(list(rows.values())))
+    return [_cache[(dist, int(network_size))][(float(loc), float(scale))] for network_size,loc,scale in params]
+
+
+def target_grid(dist, network_sizes, locs, scales):
+    #{(network_size, loc, scale): target} for every combination, for sweeps over shape parameters
+    params = [(network_size, loc, scale) for network_size in network_sizes for loc in locs for scale in scales]
+    return dict(zip(params, targets(dist, params)))
+
+
+#the targets used by iteration_experiment, as lists so they can go straight into configs
+def exponential_target(network_size):
+    return list(targets("expon", [(network_size, 1, network_size/5)])[0])
+
+
+def normal_target(network_size):
+    return list(targets("norm", [(network_size, network_size/4, network_size/10)])[0])
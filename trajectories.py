@@ -0,0 +1,95 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+
+#per-generation error of every (experiment, rep, objective), stored as float32 chunks of equal length rows
+#alongside an index that maps each trajectory to its chunk and row and records how long it really is
+INDEX_COLS = ["experiment_name", "rep", "objective", "length", "chunk", "row", "stride"]
+
+
+class TrajectoryWriter:
+    def __init__(self, store_path, chunk_rows=4096):
+        self.store_path = store_path
+        self.tmp_path = "{}.tmp".format(store_path)
+        self.chunk_rows = chunk_rows
+        self.buffers = {}
+        self.index_rows = []
+        self.num_chunks = 0
+        if os.path.exists(self.tmp_path):
+            shutil.rmtree(self.tmp_path)
+        os.makedirs(self.tmp_path)
+
+    def add(self, experiment_name, rep, objective, fitnesses, stride=1, num_generations=None):
+        #fitnesses holds the error of every stride-th generation
+        #runs that stop early have shorter logs, so rows are padded with NaN to the configured num_generations
+        #and every run of a budget shares chunks whatever generation it stopped at
+        trajectory = np.asarray(fitnesses, dtype=np.float32)
+        length = len(trajectory)
+        width = length if num_generations is None else max(length, -(-num_generations // stride))
+        if length < width:
+            trajectory = np.concatenate([trajectory, np.full(width-length, np.nan, dtype=np.float32)])
+        key = (width, stride)
+        if key not in self.buffers:
+            self.buffers[key] = []
+        self.buffers[key].append(([experiment_name, rep, objective, length], trajectory))
+        if len(self.buffers[key]) >= self.chunk_rows:
+            self._flush(key)
+
+    def _flush(self, key):
+        buffer = self.buffers.pop(key)
+        np.save("{}/chunk_{}.npy".format(self.tmp_path, self.num_chunks), np.stack([t for _,t in buffer]))
+        for row,(labels,_) in enumerate(buffer):
+            self.index_rows.append(labels + [self.num_chunks, row, key[1]])
+        self.num_chunks += 1
+
+    def close(self):
+        for key in list(self.buffers):
+            self._flush(key)
+        index = pd.DataFrame(data=self.index_rows, columns=INDEX_COLS)
+        index.to_csv("{}/index.csv".format(self.tmp_path), index=False)
+        if os.path.exists(self.store_path):
+            shutil.rmtree(self.store_path)
+        os.rename(self.tmp_path, self.store_path)
+
+
+def load_index(store_path, experiment_names=None, objectives=None):
+    index = pd.read_csv("{}/index.csv".format(store_path), dtype={"experiment_name": str, "rep": str, "objective": str})
+    if experiment_names is not None:
+        index = index[index["experiment_name"].isin(experiment_names)]
+    if objectives is not None:
+        index = index[index["objective"].isin(objectives)]
+    return index.reset_index(drop=True)
+
+
+def _chunks(store_path, index):
+    for chunk,rows in index.groupby("chunk").indices.items():
+        trajectories = np.load("{}/chunk_{}.npy".format(store_path, chunk), mmap_mode="r")
+        yield rows, trajectories[index["row"].values[rows]]
+
+
+def read_trajectories(store_path, experiment_names=None, objectives=None, stride=1):
+    #returns the index and a list of trajectories in the same order, downsampled by stride and without their padding
+    index = load_index(store_path, experiment_names, objectives)
+    lengths = -(-index["length"].values // stride)
+    trajectories = [None]*len(index)
+    for rows,chunk in _chunks(store_path, index):
+        chunk = np.asarray(chunk[:, ::stride])
+        for i,row in enumerate(rows):
+            trajectories[row] = chunk[i, :lengths[row]]
+    return index, trajectories
+
+
+def first_hit_generation(store_path, target=0, experiment_names=None, objectives=None):
+    #generation at which each trajectory's error first reached target, or -1 if it never did
+    #with a stride > 1 the generation is only accurate to within stride generations, padding is NaN so it never hits
+    index = load_index(store_path, experiment_names, objectives)
+    generations = np.full(len(index), -1, dtype=np.int64)
+    for rows,chunk in _chunks(store_path, index):
+        hit = chunk <= target
+        first = hit.argmax(axis=1)
+        generations[rows] = np.where(hit.any(axis=1), first*index["stride"].values[rows], -1)
+    index["first_hit_generation"] = generations
+    return index[["experiment_name", "rep", "objective", "first_hit_generation"]]